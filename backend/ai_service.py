@@ -0,0 +1,134 @@
+# AI scoring service used by the API (wraps XGBoostDetector)
+import atexit
+import math
+import os
+import threading
+
+
+def create_detector(backend=None):
+    """
+    Detector for ML_BACKEND: 'xgboost' (default) or 'numpy', which serves
+    trees exported by 'python ml_engine.py export' without importing xgboost.
+    """
+    backend = backend or os.getenv('ML_BACKEND', 'xgboost')
+    if backend == 'numpy':
+        from ml_engine import CompiledDetector
+        return CompiledDetector()
+    if backend == 'xgboost':
+        from ml_engine import XGBoostDetector
+        return XGBoostDetector()
+    raise ValueError(f"Unknown ML_BACKEND: {backend}")
+
+
+def invalid_feature(features):
+    """Name of the first feature that is not a finite number (None if all are)"""
+    for name, value in features.items():
+        if not isinstance(value, (int, float)) or not math.isfinite(value):
+            return name
+    return None
+
+
+def score_features(detector, features_list, explain=True):
+    """Score (and optionally explain) many feature dicts with one detector"""
+    scores = detector.predict_risk_batch(features_list)
+    if not explain:
+        return [{'risk_score': score} for score in scores]
+    explanations = detector.explain_risk_batch(features_list)
+    return [
+        {'risk_score': score, **explanation}
+        for score, explanation in zip(scores, explanations)
+    ]
+
+
+class AIService:
+    """
+    Owns the XGBoostDetector for the API process and optionally routes
+    single-row requests through micro-batchers, so concurrent requests are
+    scored in one vectorized predict_proba/shap_values call.
+
+    With process_pool enabled the model runs in an MLPool of worker
+    processes instead, and answers degrade to rules-only results when the
+    pool is saturated or too slow.
+    """
+
+    def __init__(self, micro_batch=None, max_batch=None, max_wait_ms=None, process_pool=None):
+        self.micro_batch = os.getenv('ML_MICRO_BATCH', '0') == '1' if micro_batch is None else micro_batch
+        self.max_batch = max_batch or int(os.getenv('ML_MICRO_BATCH_SIZE', 64))
+        self.max_wait_ms = max_wait_ms or float(os.getenv('ML_MICRO_BATCH_WAIT_MS', 5))
+        self.process_pool = os.getenv('ML_PROCESS_POOL', '0') == '1' if process_pool is None else process_pool
+        self._detector = None
+        self._batchers = None
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def detector(self):
+        """Imported and created on first use so the API starts without xgboost/shap"""
+        if self._detector is None:
+            with self._lock:
+                if self._detector is None:
+                    self._detector = create_detector()
+        return self._detector
+
+    @property
+    def pool(self):
+        """Worker processes with preloaded detectors, started on first use"""
+        return self.start_pool()
+
+    def start_pool(self):
+        """Start the worker processes now (e.g. before serving traffic); returns the MLPool"""
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    from ml_pool import MLPool
+                    workers = int(os.getenv('ML_POOL_WORKERS', 2))
+                    self._pool = MLPool(
+                        workers=workers,
+                        max_pending=int(os.getenv('ML_POOL_MAX_PENDING', workers * 4)),
+                        timeout=float(os.getenv('ML_POOL_TIMEOUT_MS', 2000)) / 1000.0,
+                        start_method=os.getenv('ML_POOL_START_METHOD', 'spawn')
+                    ).start()
+                    atexit.register(self._pool.close)
+        return self._pool
+
+    def analyze_batch(self, features_list, explain=True):
+        """Score (and optionally explain) many feature dicts in one vectorized call"""
+        if self.process_pool:
+            return self.pool.analyze_batch(features_list, explain)
+        return score_features(self.detector, features_list, explain)
+
+    def _get_batchers(self):
+        if self._batchers is None:
+            with self._lock:
+                if self._batchers is None:
+                    from micro_batcher import MicroBatcher
+                    self._batchers = {
+                        explain: MicroBatcher(
+                            lambda items, explain=explain: self.analyze_batch(items, explain),
+                            max_batch=self.max_batch,
+                            max_wait_ms=self.max_wait_ms,
+                            name=f'ml-batcher-{"explain" if explain else "predict"}'
+                        )
+                        for explain in (True, False)
+                    }
+        return self._batchers
+
+    def analyze(self, features, explain=True):
+        """Score one feature dict, sharing a batch with concurrent callers if enabled"""
+        if self.micro_batch:
+            return self._get_batchers()[explain](features)
+        return self.analyze_batch([features], explain)[0]
+
+    def stats(self):
+        return {
+            'micro_batch': self.micro_batch,
+            'process_pool': self._pool.stats() if self._pool else None,
+            'backend': os.getenv('ML_BACKEND', 'xgboost'),
+            'model_loaded': self._detector is not None and self._detector._model is not None,
+            'explain_mode': self._detector.explain_mode if self._detector else None,
+            'explain_cache': self._detector.explain_cache.stats() if self._detector else None,
+            'batchers': {
+                ('explain' if explain else 'predict'): batcher.stats()
+                for explain, batcher in (self._batchers or {}).items()
+            }
+        }
@@ -1,22 +1,90 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 from risk_engine import RiskEngine
 from auth import hash_password, verify_password, generate_token, token_required, optional_token
-from database import db_session, init_db
-from models import User, WiFiScan, RiskLog, UserSettings, UserBadge, NetworkDevice, SecurityTest, TrustedNetwork, NetworkRating
+from database import db_session, read_session, init_db
+from models import User, UserSettings, UserBadge, LeaderboardEntry, UserStats, NetworkDevice, SecurityTest, TrustedNetwork, NetworkRating
 from security_tests import SecurityTests
 from gamification import GamificationEngine
+from scan_recorder import ScanRecorder
+from ratings import RatingAggregator
+from safety_engine import SafetyEngine
+from gateway_index import GatewayIndex, gateway_index
+from ssid_index import ssid_index
+from scan_history import ScanHistory
+from ai_service import AIService, invalid_feature
+from scan_writer import ScanWriter
+import atexit
 import json
 import os
 import random
+import threading
 import datetime
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
-engine = RiskEngine()
-
-# Initialize database
-init_db()
+engine = RiskEngine(gateways=gateway_index())
+
+# Upper bound on networks accepted by /api/scan/analyze-batch
+MAX_BATCH_SCANS = int(os.getenv('MAX_BATCH_SCANS', 200))
+
+# Write-behind mode: return scan results before they are committed and let a
+# background thread persist them with group commits
+WRITE_BEHIND = os.getenv('SCAN_WRITE_BEHIND', '0') == '1'
+scan_writer = ScanWriter(max_queue=int(os.getenv('SCAN_WRITE_QUEUE', 1000)))
+if WRITE_BEHIND:
+    scan_writer.start()
+    atexit.register(scan_writer.close)
+
+# AI model is loaded on the first /api/ai request
+ai_service = AIService()
+
+# Upper bound on BSSIDs accepted by /api/safety/scores
+MAX_SAFETY_BSSIDS = int(os.getenv('MAX_SAFETY_BSSIDS', 100))
+safety_engine = SafetyEngine()
+
+# Upper bound on URLs accepted by /api/phishing/check-batch
+MAX_BATCH_URLS = int(os.getenv('MAX_BATCH_URLS', 1000))
+
+# PhishingGuard (and NumPy) are loaded on the first /api/phishing request
+_phishing_guard = None
+_phishing_lock = threading.Lock()
+
+def get_phishing_guard():
+    global _phishing_guard
+    if _phishing_guard is None:
+        with _phishing_lock:
+            if _phishing_guard is None:
+                from phishing_guard import PhishingGuard
+                _phishing_guard = PhishingGuard()
+    return _phishing_guard
+
+# Tables and derived-table backfills are set up on the first request (or by
+# `python app.py`), not at import time, so the process starts serving quickly
+_db_ready = False
+_db_lock = threading.Lock()
+
+def prepare_database():
+    """Create tables and backfill derived tables, once per process"""
+    global _db_ready
+    if _db_ready:
+        return
+    with _db_lock:
+        if not _db_ready:
+            init_db()
+            GamificationEngine.ensure_leaderboard()
+            GamificationEngine.ensure_user_stats()
+            RatingAggregator.ensure()
+            SafetyEngine.ensure()
+            GatewayIndex.ensure()
+            ssid_index().rebuild()  # In-memory only, so rebuilt on every start
+            _db_ready = True
+
+@app.before_request
+def ensure_database():
+    # Health checks must answer during a cold start without touching the DB
+    if request.endpoint != 'health_check':
+        prepare_database()
 
 # ============================================
 # Health & Info Routes
@@ -37,7 +105,10 @@ def home():
         <li>POST /api/auth/login - User login</li>
         <li>GET /api/user/profile - Get user profile (requires auth)</li>
         <li>POST /api/scan/analyze - Analyze WiFi network</li>
+        <li>POST /api/scan/analyze-batch - Analyze many WiFi networks at once</li>
         <li>GET /api/scan/history - Get scan history (requires auth)</li>
+        <li>POST /api/ai/analyze - AI risk score with Marathi explanation</li>
+        <li>GET /api/scan/history/export - Download scan history as NDJSON/CSV (requires auth)</li>
     </ul>
     """, 200
 
@@ -103,6 +174,10 @@ def register():
             )
             db_session.add(badge)
         
+        # Leaderboard and statistics rows
+        db_session.add(LeaderboardEntry(user_id=user.id, points=0, scans_count=0, level=1))
+        db_session.add(UserStats(user_id=user.id, scans_count=0, unique_networks=0, threats_found=0))
+        
         db_session.commit()
         
         # Generate token
@@ -155,7 +230,7 @@ def login():
             'display_name': user.display_name,
             'points': user.points,
             'level': user.level,
-            'rank': user.rank
+            'rank': GamificationEngine.get_rank(user.points)
         }
     }), 200
 
@@ -169,17 +244,13 @@ def get_profile():
     """Get user profile"""
     user_id = request.current_user['user_id']
     
-    user = db_session.query(User).filter(User.id == user_id).first()
+    user = read_session.query(User).filter(User.id == user_id).first()
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
-    # Count scans and threats
-    scans_count = db_session.query(WiFiScan).filter(WiFiScan.user_id == user_id).count()
-    threats_count = db_session.query(RiskLog).join(WiFiScan).filter(
-        WiFiScan.user_id == user_id,
-        RiskLog.status.in_(['WARNING', 'DANGER'])
-    ).count()
-    badges_earned = db_session.query(UserBadge).filter(
+    # Scan and threat counts from the user_stats projection
+    stats = GamificationEngine.get_user_stats(user_id, read_session)
+    badges_earned = read_session.query(UserBadge).filter(
         UserBadge.user_id == user_id,
         UserBadge.is_earned == True
     ).count()
@@ -191,10 +262,10 @@ def get_profile():
         'display_name': user.display_name,
         'points': user.points,
         'level': user.level,
-        'rank': user.rank,
+        'rank': GamificationEngine.get_rank(user.points, read_session),
         'location': user.location,
-        'scans_count': scans_count,
-        'threats_found': threats_count,
+        'scans_count': stats['scans_count'],
+        'threats_found': stats['threats_found'],
         'badges_earned': badges_earned,
         'created_at': user.created_at.isoformat() if user.created_at else None
     }), 200
@@ -224,6 +295,35 @@ def update_profile():
 # Network Scanning Routes
 # ============================================
 
+def persist_scan_results(entries):
+    """
+    Persist analyzed scans and add scan_id/points_earned to each result.
+    In write-behind mode the entries are queued and scan_id is None; if the
+    queue is full the write falls back to the request thread.
+    Returns False (and marks every result persisted=False) if nothing was stored.
+    """
+    if WRITE_BEHIND and scan_writer.submit(entries):
+        for _, result, user_id in entries:
+            result['scan_id'] = None
+            result['points_earned'] = ScanRecorder.points_for(result) if user_id else 0
+            result['queued'] = True
+        return True
+    
+    try:
+        records = ScanRecorder.record_scans(entries)
+        for (_, result, _), record in zip(entries, records):
+            result['scan_id'] = record['scan_id']
+            result['points_earned'] = record['points_earned']
+        return True
+    except Exception as e:
+        print(f"DB Error: {e}")
+        db_session.rollback()
+        for _, result, _ in entries:
+            result['scan_id'] = None
+            result['points_earned'] = 0
+            result['persisted'] = False
+        return False
+
 @app.route('/api/scan/analyze', methods=['POST'])
 @optional_token
 def analyze_wifi():
@@ -231,6 +331,9 @@ def analyze_wifi():
     data = request.json
     if not data:
         return jsonify({"error": "No data provided"}), 400
+    invalid = ScanRecorder.invalid_field(data)
+    if invalid:
+        return jsonify({"error": f"Invalid value for {invalid}"}), 400
     
     # Get user_id if authenticated
     user_id = request.current_user['user_id'] if request.current_user else None
@@ -238,97 +341,96 @@ def analyze_wifi():
     # Analyze network
     result = engine.analyze_wifi_network(data)
     
-    try:
-        # Save scan data
-        scan = WiFiScan(
-            ssid=data.get('ssid'),
-            bssid=data.get('bssid', '00:00:00:00:00:00'),
-            encryption=data.get('encryption'),
-            signal_dbm=data.get('signal_dbm'),
-            user_id=user_id
-        )
-        
-        # Add optional fields
-        if 'snr_db' in data:
-            scan.snr_db = data['snr_db']
-        if 'congestion_pct' in data:
-            scan.congestion_pct = data['congestion_pct']
-        if 'latency_ms' in data:
-            scan.latency_ms = data['latency_ms']
-        if 'gateway_mac' in data:
-            scan.gateway_mac = data['gateway_mac']
-        if 'latitude' in data:
-            scan.latitude = data['latitude']
-        if 'longitude' in data:
-            scan.longitude = data['longitude']
-        
-        db_session.add(scan)
-        db_session.flush()  # Get scan ID
-        
-        # Save risk log
-        risk_log = RiskLog(
-            scan_id=scan.id,
-            risk_score=result['risk_score'],
-            status=result['status'],
-            alerts_json=json.dumps(result['alerts']),
-            ssid=result['ssid']
-        )
-        db_session.add(risk_log)
-        
-        # Award points if user is authenticated
-        points_earned = 0
-        if user_id:
-            user = db_session.query(User).filter(User.id == user_id).first()
-            if user:
-                points_earned = 10  # Base points for scanning
-                if result['status'] == 'DANGER':
-                    points_earned += 20  # Bonus for finding threats
-                user.points += points_earned
-        
-        db_session.commit()
-        
-        # Add scan_id and points to result
-        result['scan_id'] = scan.id
-        result['points_earned'] = points_earned
-        
-    except Exception as e:
-        print(f"DB Error: {e}")
-        db_session.rollback()
+    # Save scan, risk log and points
+    persist_scan_results([(data, result, user_id)])
     
     return jsonify(result), 200
 
+@app.route('/api/scan/analyze-batch', methods=['POST'])
+@optional_token
+def analyze_wifi_batch():
+    """Analyze many WiFi networks and persist them in one transaction"""
+    data = request.json
+    if not data or not isinstance(data.get('scans'), list) or not data['scans']:
+        return jsonify({"error": "scans array required"}), 400
+    
+    scans = data['scans']
+    if len(scans) > MAX_BATCH_SCANS:
+        return jsonify({"error": f"At most {MAX_BATCH_SCANS} scans per batch"}), 413
+    if not all(isinstance(scan, dict) for scan in scans):
+        return jsonify({"error": "Each scan must be an object"}), 400
+    # One bad scan would roll back the whole transaction, so reject it up front
+    for index, scan in enumerate(scans):
+        invalid = ScanRecorder.invalid_field(scan)
+        if invalid:
+            return jsonify({"error": f"Invalid value for {invalid}", "index": index}), 400
+    
+    # Get user_id if authenticated
+    user_id = request.current_user['user_id'] if request.current_user else None
+    
+    # Score everything first, then write once
+    results = [engine.analyze_wifi_network(scan) for scan in scans]
+    persisted = persist_scan_results([(scan, result, user_id) for scan, result in zip(scans, results)])
+    
+    return jsonify({
+        'results': results,
+        'total': len(results),
+        'persisted': persisted,
+        'points_earned': sum(r.get('points_earned', 0) for r in results)
+    }), 200
+
 @app.route('/api/scan/history', methods=['GET'])
 @token_required
 def get_scan_history():
-    """Get user's scan history"""
+    """
+    Get user's scan history, newest first.
+    Pass the returned next_cursor as ?cursor= to get the following page.
+    The legacy ?offset= parameter is still honoured when no cursor is given.
+    """
     user_id = request.current_user['user_id']
     limit = request.args.get('limit', 50, type=int)
+    cursor = request.args.get('cursor')
     offset = request.args.get('offset', 0, type=int)
+    include_total = request.args.get('include_total', '1') != '0'
     
-    scans = db_session.query(WiFiScan, RiskLog).join(RiskLog).filter(
-        WiFiScan.user_id == user_id
-    ).order_by(WiFiScan.timestamp.desc()).limit(limit).offset(offset).all()
-    
-    total = db_session.query(WiFiScan).filter(WiFiScan.user_id == user_id).count()
+    try:
+        scans, next_cursor = ScanHistory.page(read_session, user_id, limit, cursor, offset)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     result = {
-        'scans': [
-            {
-                'scan_id': scan.id,
-                'timestamp': scan.timestamp.isoformat(),
-                'ssid': scan.ssid,
-                'bssid': scan.bssid,
-                'encryption': scan.encryption,
-                'risk_score': risk.risk_score,
-                'status': risk.status
-            }
-            for scan, risk in scans
-        ],
-        'total': total
+        'scans': scans,
+        'next_cursor': next_cursor
     }
     
+    # Total comes from the user_stats projection, not a COUNT(*)
+    if include_total:
+        result['total'] = GamificationEngine.get_user_stats(user_id, read_session)['scans_count']
+    
     return jsonify(result), 200
 
+@app.route('/api/scan/history/export', methods=['GET'])
+@token_required
+def export_scan_history():
+    """Stream the user's full scan history as NDJSON (default) or CSV"""
+    user_id = request.current_user['user_id']
+    export_format = request.args.get('format', 'ndjson')
+    
+    if export_format == 'csv':
+        body = ScanHistory.export_csv(read_session, user_id)
+        mimetype = 'text/csv'
+    elif export_format == 'ndjson':
+        body = ScanHistory.export_ndjson(read_session, user_id)
+        mimetype = 'application/x-ndjson'
+    else:
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+    
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=scan_history.{export_format}'}
+    )
+
 # ============================================
 # Cleanup
 # ============================================
@@ -438,15 +540,26 @@ def test_ssl_strip():
 @app.route('/api/test/arp-monitor', methods=['POST'])
 @optional_token
 def test_arp_monitor():
-    """Run ARP monitoring test"""
+    """
+    Run ARP monitoring test.
+    Without previous_gateway_mac, pass 'bssid' to compare against the gateway
+    other users see on the same network.
+    """
     data = request.json
     
-    if not data or not data.get('current_gateway_mac'):
+    if not isinstance(data, dict) or not data.get('current_gateway_mac'):
         return jsonify({'error': 'current_gateway_mac required'}), 400
+    if not isinstance(data['current_gateway_mac'], str):
+        return jsonify({'error': 'current_gateway_mac must be a string'}), 400
+    
+    consensus = None
+    if not data.get('previous_gateway_mac') and data.get('bssid'):
+        consensus = gateway_index().consensus(data['bssid'])
     
     result = SecurityTests.arp_monitor_test(
         data['current_gateway_mac'],
-        data.get('previous_gateway_mac')
+        data.get('previous_gateway_mac'),
+        consensus
     )
     
     return jsonify(result), 200
@@ -535,7 +648,7 @@ def get_trusted_networks():
     """Get user's trusted networks"""
     user_id = request.current_user['user_id']
     
-    networks = db_session.query(TrustedNetwork).filter(
+    networks = read_session.query(TrustedNetwork).filter(
         TrustedNetwork.user_id == user_id
     ).order_by(TrustedNetwork.added_at.desc()).all()
     
@@ -607,35 +720,27 @@ def get_leaderboard():
     # For simplicity, showing all-time leaderboard
     # In production, would filter by timeframe
     
-    users = db_session.query(User).order_by(
-        User.points.desc()
-    ).limit(limit).all()
+    # Single read of the materialized leaderboard (idx_leaderboard_points)
+    rows = read_session.query(LeaderboardEntry, User.username, User.display_name).join(
+        User, User.id == LeaderboardEntry.user_id
+    ).order_by(LeaderboardEntry.points.desc(), LeaderboardEntry.user_id).limit(limit).all()
     
-    # Get badge info for each user
+    # Same competition ranking as get_rank: everyone with more points is
+    # already above this row, so tied users share the rank of the first of them
     leaders = []
-    for rank, user in enumerate(users, 1):
-        # Get user's top badge
-        earned_badges = db_session.query(UserBadge).filter(
-            UserBadge.user_id == user.id,
-            UserBadge.is_earned == True
-        ).all()
-        
-        top_badge = 'guardian' if earned_badges else None
-        
-        # Count scans
-        scans_count = db_session.query(WiFiScan).filter(
-            WiFiScan.user_id == user.id
-        ).count()
-        
+    rank = 0
+    for position, (entry, username, display_name) in enumerate(rows, 1):
+        if not leaders or entry.points != leaders[-1]['points']:
+            rank = position
         leaders.append({
-            'user_id': user.id,
-            'username': user.username,
-            'display_name': user.display_name or user.username,
-            'points': user.points,
-            'scans_count': scans_count,
+            'user_id': entry.user_id,
+            'username': username,
+            'display_name': display_name or username,
+            'points': entry.points,
+            'scans_count': entry.scans_count,
             'rank': rank,
-            'badge': top_badge,
-            'level': user.level
+            'badge': entry.top_badge,
+            'level': entry.level
         })
     
     # Get current user's rank if authenticated
@@ -643,9 +748,9 @@ def get_leaderboard():
     user_points = None
     if hasattr(request, 'current_user') and request.current_user:
         user_id = request.current_user['user_id']
-        user = db_session.query(User).filter(User.id == user_id).first()
+        user = read_session.query(User).filter(User.id == user_id).first()
         if user:
-            user_rank = user.rank
+            user_rank = GamificationEngine.get_rank(user.points, read_session)
             user_points = user.points
     
     return jsonify({
@@ -661,7 +766,7 @@ def get_user_badges():
     user_id = request.current_user['user_id']
     
     # Get user badges
-    user_badges = db_session.query(UserBadge).filter(
+    user_badges = read_session.query(UserBadge).filter(
         UserBadge.user_id == user_id
     ).all()
     
@@ -711,6 +816,7 @@ def rate_network():
     )
     
     db_session.add(rating)
+    RatingAggregator.record(rating)
     db_session.commit()
     
     # Award points for rating
@@ -731,21 +837,12 @@ def get_network_ratings():
     if not bssid:
         return jsonify({'error': 'bssid required'}), 400
     
-    ratings = db_session.query(NetworkRating, User).join(User).filter(
+    ratings = read_session.query(NetworkRating, User).join(User).filter(
         NetworkRating.bssid == bssid
     ).order_by(NetworkRating.timestamp.desc()).limit(10).all()
     
-    # Calculate averages
-    all_ratings = db_session.query(NetworkRating).filter(
-        NetworkRating.bssid == bssid
-    ).all()
-    
-    if all_ratings:
-        avg_safety = sum(r.safety_rating for r in all_ratings if r.safety_rating) / len([r for r in all_ratings if r.safety_rating]) if any(r.safety_rating for r in all_ratings) else 0
-        avg_speed = sum(r.speed_rating for r in all_ratings if r.speed_rating) / len([r for r in all_ratings if r.speed_rating]) if any(r.speed_rating for r in all_ratings) else 0
-        avg_reliability = sum(r.reliability_rating for r in all_ratings if r.reliability_rating) / len([r for r in all_ratings if r.reliability_rating]) if any(r.reliability_rating for r in all_ratings) else 0
-    else:
-        avg_safety = avg_speed = avg_reliability = 0
+    # Averages from the running aggregate
+    summary = RatingAggregator.summary(bssid, read_session)
     
     recent_comments = [
         {
@@ -761,13 +858,146 @@ def get_network_ratings():
     
     return jsonify({
         'bssid': bssid,
-        'average_safety': round(avg_safety, 1),
-        'average_speed': round(avg_speed, 1),
-        'average_reliability': round(avg_reliability, 1),
-        'total_ratings': len(all_ratings),
+        'average_safety': round(summary['average_safety'], 1),
+        'average_speed': round(summary['average_speed'], 1),
+        'average_reliability': round(summary['average_reliability'], 1),
+        'total_ratings': summary['total_ratings'],
         'recent_comments': recent_comments
     }), 200
 
+# ============================================
+# Safety Score Routes
+# ============================================
+
+@app.route('/api/safety/scores', methods=['POST'])
+def get_safety_scores():
+    """
+    Long-term safety score and trend for many routers at once (network list screen).
+    Body: {'bssids': ['AA:BB:...', ...]}
+    """
+    data = request.json
+    if not data or not isinstance(data.get('bssids'), list) or not data['bssids']:
+        return jsonify({'error': 'bssids array required'}), 400
+    
+    bssids = data['bssids']
+    if len(bssids) > MAX_SAFETY_BSSIDS:
+        return jsonify({'error': f"At most {MAX_SAFETY_BSSIDS} BSSIDs per request"}), 413
+    if not all(isinstance(bssid, str) for bssid in bssids):
+        return jsonify({'error': 'Each BSSID must be a string'}), 400
+    
+    scores = safety_engine.calculate_historical_scores(bssids, session=read_session)
+    return jsonify({'scores': scores, 'total': len(scores)}), 200
+
+# ============================================
+# Phishing Routes
+# ============================================
+
+@app.route('/api/phishing/check-batch', methods=['POST'])
+def phishing_check_batch():
+    """
+    Typo-squatting / look-alike verdicts for many URLs (e.g. a browser history).
+    Body: {'urls': ['https://...', ...]}. Verdicts are cached per host.
+    """
+    data = request.json
+    if not data or not isinstance(data.get('urls'), list) or not data['urls']:
+        return jsonify({'error': 'urls array required'}), 400
+    
+    urls = data['urls']
+    if len(urls) > MAX_BATCH_URLS:
+        return jsonify({'error': f"At most {MAX_BATCH_URLS} URLs per batch"}), 413
+    if not all(isinstance(url, str) for url in urls):
+        return jsonify({'error': 'Each URL must be a string'}), 400
+    
+    results = get_phishing_guard().check_urls(urls)
+    return jsonify({
+        'results': results,
+        'total': len(results),
+        'phishing': sum(1 for r in results if r['is_phishing'])
+    }), 200
+
+# ============================================
+# AI Analysis Routes
+# ============================================
+
+@app.route('/api/ai/analyze', methods=['POST'])
+@optional_token
+def ai_analyze():
+    """
+    XGBoost risk score plus SHAP top factor.
+    Body: {'features': {...}} for one network or {'features': [{...}, ...]} for many.
+    Pass 'explain': false to skip the SHAP explanation.
+    Results marked 'degraded': true are rules-only answers given while the
+    ML process pool was saturated or timed out.
+    """
+    data = request.json
+    if not data or not data.get('features'):
+        return jsonify({'error': 'features required'}), 400
+    
+    features = data['features']
+    explain = data.get('explain', True) is not False
+    
+    if isinstance(features, list):
+        if len(features) > MAX_BATCH_SCANS:
+            return jsonify({'error': f"At most {MAX_BATCH_SCANS} feature sets per batch"}), 413
+        if not all(isinstance(f, dict) for f in features):
+            return jsonify({'error': 'Each features entry must be an object'}), 400
+        for index, entry in enumerate(features):
+            invalid = invalid_feature(entry)
+            if invalid:
+                return jsonify({'error': f"Feature {invalid} must be a number", 'index': index}), 400
+        results = ai_service.analyze_batch(features, explain)
+        return jsonify({'results': results, 'total': len(results)}), 200
+    
+    if not isinstance(features, dict):
+        return jsonify({'error': 'features must be an object or array'}), 400
+    invalid = invalid_feature(features)
+    if invalid:
+        return jsonify({'error': f"Feature {invalid} must be a number"}), 400
+    
+    return jsonify(ai_service.analyze(features, explain)), 200
+
+# ============================================
+# Metrics Routes
+# ============================================
+
+@app.route('/api/metrics/risk-rules', methods=['GET'])
+def get_risk_rule_metrics():
+    """Per-rule evaluation counts, hit counts and CPU time"""
+    return jsonify({'rules': engine.rules.stats()}), 200
+
+@app.route('/api/metrics/ai', methods=['GET'])
+def get_ai_metrics():
+    """AI model and micro-batching counters"""
+    return jsonify(ai_service.stats()), 200
+
+@app.route('/api/metrics/phishing', methods=['GET'])
+def get_phishing_metrics():
+    """Protected-domain list version and verdict cache counters"""
+    if _phishing_guard is None:
+        return jsonify({'loaded': False}), 200
+    return jsonify({
+        'loaded': True,
+        'official_sites': len(_phishing_guard.official_sites),
+        'verified_domains': len(_phishing_guard.registry),
+        'version': _phishing_guard.version,
+        'verdict_cache': _phishing_guard.verdict_cache.stats()
+    }), 200
+
+@app.route('/api/metrics/gateway-index', methods=['GET'])
+def get_gateway_index_metrics():
+    """Cached BSSIDs and hit rate of the gateway-MAC index"""
+    return jsonify(gateway_index().stats()), 200
+
+@app.route('/api/metrics/ssid-index', methods=['GET'])
+def get_ssid_index_metrics():
+    """SSIDs and observations in the evil-twin fingerprint index"""
+    return jsonify(ssid_index().stats()), 200
+
+@app.route('/api/metrics/scan-writer', methods=['GET'])
+def get_scan_writer_metrics():
+    """Write-behind queue depth and counters"""
+    return jsonify({'enabled': WRITE_BEHIND, **scan_writer.stats()}), 200
+
 # ============================================
 # Cleanup
 # ============================================
@@ -775,6 +1005,10 @@ def get_network_ratings():
 @app.teardown_appcontext
 def shutdown_session(exception=None):
     db_session.remove()
+    read_session.remove()
 
 if __name__ == '__main__':
+    prepare_database()
+    if ai_service.process_pool:
+        ai_service.start_pool()  # Let the workers load their models before traffic arrives
     app.run(debug=True, host='0.0.0.0', port=5000)
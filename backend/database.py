@@ -1,11 +1,61 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
-engine = create_engine('sqlite:///project.db')
+# Database configuration (override with environment variables)
+DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///project.db')
+DATABASE_READ_URL = os.getenv('DATABASE_READ_URL', DATABASE_URL)
+READ_POOL_SIZE = int(os.getenv('DATABASE_READ_POOL_SIZE', 10))
+
+# Applied to every new SQLite connection
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),  # Readers no longer block on writers
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),  # Safe with WAL, far fewer fsyncs
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', -64000)),  # Negative = KiB (64 MB)
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+}
+
+def _is_sqlite_memory(url):
+    return url in ('sqlite://', 'sqlite:///:memory:')
+
+def make_engine(url, read_only=False, **kwargs):
+    """
+    Create an engine for the given URL.
+    SQLite connections get the SQLITE_PRAGMAS profile; read_only engines
+    additionally set query_only so a stray write fails instead of taking
+    the write lock.
+    """
+    engine = create_engine(url, **kwargs)
+
+    if engine.dialect.name == 'sqlite':
+        @event.listens_for(engine, 'connect')
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in SQLITE_PRAGMAS.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            if read_only:
+                cursor.execute("PRAGMA query_only=ON")
+            cursor.close()
+
+    return engine
+
+engine = make_engine(DATABASE_URL)
+
+# GET routes read through a separate pool so they do not queue behind scan writes.
+# An in-memory SQLite database only exists on its own connection, so share it.
+if _is_sqlite_memory(DATABASE_READ_URL):
+    read_engine = engine
+else:
+    read_engine = make_engine(DATABASE_READ_URL, read_only=True, pool_size=READ_POOL_SIZE)
+
 db_session = scoped_session(sessionmaker(autocommit=False,
                                          autoflush=False,
                                          bind=engine))
+read_session = scoped_session(sessionmaker(autocommit=False,
+                                           autoflush=False,
+                                           bind=read_engine))
 Base = declarative_base()
 Base.query = db_session.query_property()
 
@@ -0,0 +1,165 @@
+# Verified-domain registry shared by RiskEngine (GOI portals) and PhishingGuard
+import os
+import threading
+import time
+
+DEFAULT_REGISTRY_PATH = os.getenv(
+    'VERIFIED_DOMAINS_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'verified_domains.txt')
+)
+# Seconds between checks of the registry file's modification time
+RELOAD_INTERVAL = float(os.getenv('VERIFIED_DOMAINS_RELOAD_S', 30))
+
+# Trie keys that cannot collide with a DNS label
+_ENTRY = None  # Categories of the domain ending at this node (and its subdomains)
+_WILDCARD = '*'  # Categories of strict subdomains only ("*.gov.in")
+
+
+def url_host(url):
+    """Lowercase host of a URL or bare domain ('https://a.gov.in:443/x' -> 'a.gov.in')"""
+    host = url.split('://', 1)[-1]
+    for separator in '/?#':
+        host = host.split(separator, 1)[0]
+    host = host.rsplit('@', 1)[-1].split(':', 1)[0]
+    return host.strip().rstrip('.').lower()
+
+
+class DomainRegistry:
+    """
+    Verified domains, each with one or more categories, stored as a trie of
+    reversed DNS labels (in -> gov -> uidai). A lookup walks the host's labels
+    once, so its cost depends on the host, not on the number of entries.
+
+    - "uidai.gov.in"  matches uidai.gov.in and any subdomain of it
+    - "*.nic.in"      matches subdomains of nic.in only
+
+    File format (one entry per line, '#' starts a comment):
+        uidai.gov.in    goi,protected
+        *.nic.in        goi
+    Entries without categories get the 'verified' category.
+    A registry created from a path re-reads the file when it changes (checked
+    at most every reload_interval seconds on lookup), without a restart.
+    """
+
+    def __init__(self, path=None, entries=(), reload_interval=RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.version = 0
+        self._lock = threading.Lock()
+        self._root = {}
+        self._order = []  # (domain, categories) in insertion order
+        self._mtime = None
+        self._checked_at = 0.0
+        for domain, categories in entries:
+            self.add(domain, categories)
+        if path:
+            self.reload()
+
+    @staticmethod
+    def parse(lines):
+        """(domain, categories) pairs from registry file lines"""
+        for line in lines:
+            fields = line.split('#', 1)[0].split()
+            if not fields:
+                continue
+            categories = fields[1].split(',') if len(fields) > 1 else ['verified']
+            yield fields[0].lower().rstrip('.'), categories
+
+    @staticmethod
+    def _insert(root, order, domain, categories):
+        wildcard = domain.startswith('*.')
+        node = root
+        for label in reversed((domain[2:] if wildcard else domain).split('.')):
+            node = node.setdefault(label, {})
+        key = _WILDCARD if wildcard else _ENTRY
+        if key not in node:
+            order.append((domain, set()))
+            node[key] = order[-1][1]
+        node[key].update(categories)
+
+    def add(self, domain, categories=('verified',)):
+        """Add one entry at runtime (lost on the next file reload)"""
+        if isinstance(categories, str):
+            categories = [categories]
+        with self._lock:
+            self._insert(self._root, self._order, domain.lower().rstrip('.'), categories)
+            self.version += 1
+
+    def reload(self, force=False):
+        """Rebuild the trie from the file if it changed; returns True if it was reloaded"""
+        if not self.path:
+            return False
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            print(f"Domain registry not readable: {e}")
+            return False
+        if mtime == self._mtime and not force:
+            return False
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                entries = list(self.parse(f))
+        except (OSError, ValueError) as e:  # Also UnicodeDecodeError
+            print(f"Domain registry not readable, keeping the loaded entries: {e}")
+            return False
+
+        root, order = {}, []
+        for domain, categories in entries:
+            self._insert(root, order, domain, categories)
+        with self._lock:
+            self._root, self._order, self._mtime = root, order, mtime
+            self.version += 1
+        return True
+
+    def maybe_reload(self):
+        """reload() at most once per reload_interval"""
+        now = time.monotonic()
+        if self.path and now - self._checked_at >= self.reload_interval:
+            self._checked_at = now
+            self.reload()
+
+    def categories(self, host):
+        """Categories of every entry covering host (empty set if none)"""
+        self.maybe_reload()
+        node = self._root
+        labels = host.split('.')
+        found = set()
+        for remaining in range(len(labels) - 1, -1, -1):
+            node = node.get(labels[remaining])
+            if node is None:
+                break
+            if remaining and _WILDCARD in node:
+                found |= node[_WILDCARD]
+            if _ENTRY in node:
+                found |= node[_ENTRY]
+        return found
+
+    def matches(self, host, category=None):
+        """True if host is (a subdomain of) an entry, optionally of the given category"""
+        categories = self.categories(host)
+        return bool(categories) if category is None else category in categories
+
+    def matches_url(self, url, category=None):
+        return self.matches(url_host(url), category)
+
+    def domains(self, category=None):
+        """Non-wildcard entries (optionally of one category), in file order"""
+        self.maybe_reload()
+        return [domain for domain, categories in self._order
+                if not domain.startswith('*.') and (category is None or category in categories)]
+
+    def __len__(self):
+        return len(self._order)
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def verified_domains():
+    """Process-wide registry loaded from DEFAULT_REGISTRY_PATH"""
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = DomainRegistry(DEFAULT_REGISTRY_PATH)
+    return _shared
@@ -15,28 +15,17 @@ def run_evaluation():
 
     engine = RiskEngine()
     
-    y_true = [] # 1 for Risky, 0 for Safe
-    y_pred = [] 
-    
     print(f"DTO Loading {len(df)} records...")
     
-    # 2. Run Inference
-    for _, row in df.iterrows():
-        # Ground Truth
-        y_true.append(row['is_risky'])
-        
-        # Prediction
-        scan_data = {
-            "ssid": row['ssid'],
-            "encryption": row['encryption'],
-            "signal_dbm": row['signal_dbm']
-        }
-        result = engine.analyze_wifi_network(scan_data)
-        
-        # Convert Score to Binary Class (Risky if Status != SAFE)
-        # Our Engine: < 80 score is Warning/Danger (Risky)
-        is_pred_risky = 1 if result['risk_score'] < 80 else 0
-        y_pred.append(is_pred_risky)
+    # Ground Truth: 1 for Risky, 0 for Safe
+    y_true = df['is_risky'].tolist()
+    
+    # 2. Run Inference (all rows at once)
+    result = engine.analyze_batch(df[['ssid', 'encryption', 'signal_dbm']])
+    
+    # Convert Score to Binary Class (Risky if Status != SAFE)
+    # Our Engine: < 80 score is Warning/Danger (Risky)
+    y_pred = (result['risk_score'] < 80).astype(int).tolist()
 
     # 3. Calculate Metrics
     acc = accuracy_score(y_true, y_pred)
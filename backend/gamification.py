@@ -1,7 +1,7 @@
 # Gamification logic for Digital Guard
-from models import User, UserBadge, WiFiScan, RiskLog
+from models import User, UserBadge, WiFiScan, RiskLog, LeaderboardEntry, UserStats, UserSeenNetwork
 from database import db_session
-from sqlalchemy import func, desc
+from sqlalchemy import func, insert, select
 
 class GamificationEngine:
     """Handles points, levels, badges, and rankings"""
@@ -77,20 +77,30 @@ class GamificationEngine:
         else:
             return 10
     
+    @staticmethod
+    def get_rank(points, session=None):
+        """
+        Rank for a points total: 1 + number of users with more points.
+        Counted on idx_leaderboard_points, so no per-user rank column has
+        to be rewritten when someone else's points change. Ties share a rank.
+        """
+        session = session or db_session
+        ahead = session.query(func.count(LeaderboardEntry.user_id)).filter(
+            LeaderboardEntry.points > (points or 0)
+        ).scalar()
+        return ahead + 1
+    
     @staticmethod
     def update_user_rank(user_id):
-        """Update user's rank based on points"""
-        # Get all users ordered by points
-        users = db_session.query(User).order_by(desc(User.points)).all()
-        
-        for rank, user in enumerate(users, 1):
-            user.rank = rank
+        """Store the user's current rank (only this user's row is written)"""
+        user = db_session.query(User).filter(User.id == user_id).first()
+        if not user:
+            return None
         
+        user.rank = GamificationEngine.get_rank(user.points)
         db_session.commit()
         
-        # Return the specific user's rank
-        user = db_session.query(User).filter(User.id == user_id).first()
-        return user.rank if user else None
+        return user.rank
     
     @staticmethod
     def check_and_award_badges(user_id):
@@ -141,41 +151,211 @@ class GamificationEngine:
                 user_badge.is_earned = True
                 newly_earned.append(badge_id)
         
+        if newly_earned:
+            earned = {b.badge_id for b in user_badges if b.is_earned}
+            db_session.query(LeaderboardEntry).filter(LeaderboardEntry.user_id == user_id).update(
+                {LeaderboardEntry.top_badge: GamificationEngine.top_badge(earned)}, synchronize_session=False
+            )
+        
         db_session.commit()
         
         return newly_earned
     
     @staticmethod
-    def get_user_stats(user_id):
-        """Get user statistics for badge calculation"""
-        # Count total scans
-        scans_count = db_session.query(WiFiScan).filter(
-            WiFiScan.user_id == user_id
-        ).count()
-        
-        # Count unique networks (distinct BSSIDs)
-        unique_networks = db_session.query(
-            func.count(func.distinct(WiFiScan.bssid))
-        ).filter(WiFiScan.user_id == user_id).scalar() or 0
-        
-        # Count threats found
-        threats_found = db_session.query(RiskLog).join(WiFiScan).filter(
-            WiFiScan.user_id == user_id,
-            RiskLog.status.in_(['WARNING', 'DANGER'])
-        ).count()
+    def get_user_stats(user_id, session=None):
+        """Get user statistics for badge calculation (one user_stats lookup)"""
+        session = session or db_session
+        stats = session.get(UserStats, user_id)
         
         # Placeholder for shares and helps (would come from other tables)
         shares_count = 0
         helps_count = 0
         
         return {
-            'scans_count': scans_count,
-            'unique_networks': unique_networks,
-            'threats_found': threats_found,
+            'scans_count': stats.scans_count if stats else 0,
+            'unique_networks': stats.unique_networks if stats else 0,
+            'threats_found': stats.threats_found if stats else 0,
             'shares_count': shares_count,
             'helps_count': helps_count
         }
     
+    # ============================================
+    # Per-user statistics projection
+    # ============================================
+    
+    THREAT_STATUSES = ('WARNING', 'DANGER')
+    
+    @staticmethod
+    def record_scan_stats(user_id, scans, threats, bssids):
+        """
+        Fold newly ingested scans into user_stats inside the caller's
+        transaction (no commit). bssids is the set of BSSIDs in the new scans;
+        only ones not already in user_seen_bssids count as unique networks.
+        """
+        seen = {
+            row.bssid for row in db_session.query(UserSeenNetwork.bssid).filter(
+                UserSeenNetwork.user_id == user_id,
+                UserSeenNetwork.bssid.in_(bssids)
+            )
+        }
+        new_bssids = set(bssids) - seen
+        for bssid in new_bssids:
+            db_session.add(UserSeenNetwork(user_id=user_id, bssid=bssid))
+        
+        updated = db_session.query(UserStats).filter(UserStats.user_id == user_id).update({
+            UserStats.scans_count: UserStats.scans_count + scans,
+            UserStats.threats_found: UserStats.threats_found + threats,
+            UserStats.unique_networks: UserStats.unique_networks + len(new_bssids)
+        }, synchronize_session=False)
+        
+        if not updated:
+            GamificationEngine.refresh_user_stats(user_id)
+    
+    @staticmethod
+    def refresh_user_stats(user_id):
+        """Recompute one user's stats row from the scan tables (no commit)"""
+        db_session.flush()
+        scans_count = db_session.query(WiFiScan).filter(WiFiScan.user_id == user_id).count()
+        unique_networks = db_session.query(UserSeenNetwork).filter(UserSeenNetwork.user_id == user_id).count()
+        threats_found = db_session.query(RiskLog).join(WiFiScan).filter(
+            WiFiScan.user_id == user_id,
+            RiskLog.status.in_(GamificationEngine.THREAT_STATUSES)
+        ).count()
+        
+        stats = db_session.get(UserStats, user_id) or UserStats(user_id=user_id)
+        stats.scans_count = scans_count
+        stats.unique_networks = unique_networks
+        stats.threats_found = threats_found
+        db_session.add(stats)
+        return stats
+    
+    @staticmethod
+    def rebuild_user_stats():
+        """Rebuild user_stats and user_seen_bssids from scratch (backfill)"""
+        db_session.query(UserSeenNetwork).delete(synchronize_session=False)
+        db_session.query(UserStats).delete(synchronize_session=False)
+        
+        db_session.execute(insert(UserSeenNetwork).from_select(
+            ['user_id', 'bssid', 'first_seen'],
+            select(WiFiScan.user_id, WiFiScan.bssid, func.min(WiFiScan.timestamp))
+            .where(WiFiScan.user_id.isnot(None))
+            .group_by(WiFiScan.user_id, WiFiScan.bssid)
+        ))
+        
+        scans = dict(
+            db_session.query(WiFiScan.user_id, func.count(WiFiScan.id)).group_by(WiFiScan.user_id)
+        )
+        unique = dict(
+            db_session.query(UserSeenNetwork.user_id, func.count()).group_by(UserSeenNetwork.user_id)
+        )
+        threats = dict(
+            db_session.query(WiFiScan.user_id, func.count(RiskLog.id)).join(RiskLog).filter(
+                RiskLog.status.in_(GamificationEngine.THREAT_STATUSES)
+            ).group_by(WiFiScan.user_id)
+        )
+        
+        for (user_id,) in db_session.query(User.id):
+            db_session.add(UserStats(
+                user_id=user_id,
+                scans_count=scans.get(user_id, 0),
+                unique_networks=unique.get(user_id, 0),
+                threats_found=threats.get(user_id, 0)
+            ))
+        db_session.commit()
+    
+    @staticmethod
+    def ensure_user_stats():
+        """Backfill user_stats once if it is missing rows for existing users"""
+        users = db_session.query(func.count(User.id)).scalar()
+        rows = db_session.query(func.count(UserStats.user_id)).scalar()
+        if users != rows:
+            GamificationEngine.rebuild_user_stats()
+    
+    # ============================================
+    # Materialized leaderboard
+    # ============================================
+    
+    @staticmethod
+    def top_badge(earned_badge_ids):
+        """Highest badge (in BADGES order) among the earned ones"""
+        for badge_id in GamificationEngine.BADGES:
+            if badge_id in earned_badge_ids:
+                return badge_id
+        return None
+    
+    @staticmethod
+    def record_leaderboard_activity(user_id, points=0, scans=0):
+        """
+        Add points/scans to a user's leaderboard row inside the caller's
+        transaction (no commit). Rebuilds the row if it does not exist yet.
+        """
+        updated = db_session.query(LeaderboardEntry).filter(
+            LeaderboardEntry.user_id == user_id
+        ).update({
+            LeaderboardEntry.points: LeaderboardEntry.points + points,
+            LeaderboardEntry.scans_count: LeaderboardEntry.scans_count + scans
+        }, synchronize_session=False)
+        
+        if not updated:
+            GamificationEngine.refresh_leaderboard_entry(user_id)
+    
+    @staticmethod
+    def refresh_leaderboard_entry(user_id):
+        """Recompute one user's leaderboard row from the source tables (no commit)"""
+        user = db_session.query(User).filter(User.id == user_id).first()
+        if not user:
+            return None
+        
+        db_session.flush()
+        scans_count = db_session.query(WiFiScan).filter(WiFiScan.user_id == user_id).count()
+        earned = {
+            b.badge_id for b in db_session.query(UserBadge.badge_id).filter(
+                UserBadge.user_id == user_id,
+                UserBadge.is_earned == True
+            )
+        }
+        
+        entry = db_session.get(LeaderboardEntry, user_id) or LeaderboardEntry(user_id=user_id)
+        entry.points = user.points or 0
+        entry.level = user.level
+        entry.scans_count = scans_count
+        entry.top_badge = GamificationEngine.top_badge(earned)
+        db_session.add(entry)
+        return entry
+    
+    @staticmethod
+    def rebuild_leaderboard():
+        """Rebuild the whole leaderboard table (backfill for existing databases)"""
+        scan_counts = dict(
+            db_session.query(WiFiScan.user_id, func.count(WiFiScan.id))
+            .filter(WiFiScan.user_id.isnot(None))
+            .group_by(WiFiScan.user_id)
+        )
+        earned = {}
+        for user_id, badge_id in db_session.query(UserBadge.user_id, UserBadge.badge_id).filter(
+            UserBadge.is_earned == True
+        ):
+            earned.setdefault(user_id, set()).add(badge_id)
+        
+        db_session.query(LeaderboardEntry).delete(synchronize_session=False)
+        for user_id, points, level in db_session.query(User.id, User.points, User.level):
+            db_session.add(LeaderboardEntry(
+                user_id=user_id,
+                points=points or 0,
+                level=level,
+                scans_count=scan_counts.get(user_id, 0),
+                top_badge=GamificationEngine.top_badge(earned.get(user_id, ()))
+            ))
+        db_session.commit()
+    
+    @staticmethod
+    def ensure_leaderboard():
+        """Backfill the leaderboard once if it is missing rows for existing users"""
+        users = db_session.query(func.count(User.id)).scalar()
+        entries = db_session.query(func.count(LeaderboardEntry.user_id)).scalar()
+        if users != entries:
+            GamificationEngine.rebuild_leaderboard()
+    
     @staticmethod
     def award_points(user_id, points, reason=''):
         """Award points to a user and update level/rank"""
@@ -189,6 +369,11 @@ class GamificationEngine:
         # Update level
         user.level = GamificationEngine.calculate_level(user.points)
         
+        GamificationEngine.record_leaderboard_activity(user_id, points=points)
+        db_session.query(LeaderboardEntry).filter(LeaderboardEntry.user_id == user_id).update(
+            {LeaderboardEntry.level: user.level}, synchronize_session=False
+        )
+        
         db_session.commit()
         
         # Update rank
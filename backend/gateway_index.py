@@ -0,0 +1,203 @@
+# Community gateway-MAC history per BSSID (cross-user ARP spoof signal)
+import datetime
+import os
+import threading
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+from cache_utils import LRUCache
+from database import db_session, read_session
+from models import BssidGatewayMac, WiFiScan
+from ssid_index import pack_bssid
+
+# BSSIDs kept in memory (the rest are reloaded from bssid_gateway_macs on demand)
+GATEWAY_INDEX_SIZE = int(os.getenv('GATEWAY_INDEX_SIZE', 50000))
+# Seconds a cached BSSID is trusted before it is re-read (picks up other processes' ingests)
+GATEWAY_INDEX_TTL = float(os.getenv('GATEWAY_INDEX_TTL', 300))
+# A network has a consensus gateway once it has this many recent observations ...
+GATEWAY_MIN_OBSERVATIONS = int(os.getenv('GATEWAY_MIN_OBSERVATIONS', 5))
+# ... and one MAC accounts for at least this share of them
+GATEWAY_CONSENSUS_SHARE = float(os.getenv('GATEWAY_CONSENSUS_SHARE', 0.8))
+# Observations older than this are ignored (a router may be replaced)
+GATEWAY_WINDOW_DAYS = int(os.getenv('GATEWAY_WINDOW_DAYS', 30))
+
+# Placeholder BSSID given to scans that did not report one
+UNKNOWN_BSSID = '00:00:00:00:00:00'
+
+
+def canonical_bssid(bssid):
+    """'aa-bb-cc-dd-ee-ff' (any case, ':', '-' or '.' separated) -> 'AA:BB:CC:DD:EE:FF'; None if malformed or unknown"""
+    packed = pack_bssid(bssid)
+    if not packed:  # UNKNOWN_BSSID packs to 0
+        return None
+    digits = f'{packed:012X}'
+    return ':'.join(digits[i:i + 2] for i in range(0, 12, 2))
+
+
+class GatewayIndex:
+    """
+    BSSID -> {gateway MAC: [observations, last_seen]}, built from every
+    stored WiFiScan.gateway_mac. BSSIDs are keyed in canonical_bssid form and
+    gateway MACs uppercased, so clients formatting them differently agree.
+
+    bssid_gateway_macs in the database holds the full history; an LRU keeps
+    the entries of recently scanned networks in memory for up to ttl
+    seconds, so checking a scan against its network's consensus gateway is
+    a dict lookup once the BSSID is cached.
+    """
+
+    def __init__(self, maxsize=GATEWAY_INDEX_SIZE, ttl=GATEWAY_INDEX_TTL):
+        self.cache = LRUCache(maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def pairs(entries):
+        """(bssid, gateway_mac) -> observation count from (bssid, gateway_mac) tuples, keys normalized"""
+        counts = {}
+        for bssid, gateway_mac in entries:
+            bssid = canonical_bssid(bssid)
+            if bssid and isinstance(gateway_mac, str) and gateway_mac:
+                key = (bssid, gateway_mac.upper())
+                counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    @staticmethod
+    def _normalized(counts):
+        """Merge count keys that only differ in BSSID / MAC formatting (a no-op for pairs() output)"""
+        merged = {}
+        for (bssid, gateway_mac), count in counts.items():
+            bssid = canonical_bssid(bssid)
+            if bssid and isinstance(gateway_mac, str) and gateway_mac:
+                key = (bssid, gateway_mac.upper())
+                merged[key] = merged.get(key, 0) + count
+        return merged
+
+    def _load(self, bssid):
+        try:
+            rows = read_session.query(BssidGatewayMac).filter(BssidGatewayMac.bssid == bssid).all()
+        except SQLAlchemyError as e:
+            print(f"Gateway index load failed: {e}")
+            read_session.rollback()
+            rows = []  # Cached as empty, so a broken table is not queried on every scan
+        entry = {row.gateway_mac: [row.observations, row.last_seen] for row in rows}
+        self.cache.put(bssid, entry)
+        return entry
+
+    def entry(self, bssid):
+        """Gateway MACs seen on a network: {mac: [observations, last_seen]}"""
+        entry = self.cache.get(bssid)
+        if entry is None:
+            entry = self._load(bssid)
+        return entry
+
+    def consensus(self, bssid, now=None):
+        """
+        The network's usual gateway MAC over the last GATEWAY_WINDOW_DAYS, as
+        {'gateway_mac', 'share', 'observations'}; None without a clear consensus.
+        """
+        bssid = canonical_bssid(bssid)
+        if bssid is None:
+            return None
+        now = now or datetime.datetime.utcnow()
+        since = now - datetime.timedelta(days=GATEWAY_WINDOW_DAYS)
+        entry = self.entry(bssid)
+        with self._lock:  # apply() may be updating the same entry
+            recent = [(count, mac) for mac, (count, last_seen) in entry.items()
+                      if last_seen is None or last_seen >= since]
+        total = sum(count for count, _ in recent)
+        if total < GATEWAY_MIN_OBSERVATIONS:
+            return None
+        count, mac = max(recent)
+        share = count / total
+        if share < GATEWAY_CONSENSUS_SHARE:
+            return None
+        return {'gateway_mac': mac, 'share': round(share, 3), 'observations': total}
+
+    def is_gateway_changed(self, bssid, gateway_mac):
+        """True if gateway_mac differs from the network's consensus gateway"""
+        if not isinstance(gateway_mac, str) or not gateway_mac or canonical_bssid(bssid) is None:
+            return False
+        consensus = self.consensus(bssid)
+        return consensus is not None and consensus['gateway_mac'] != gateway_mac.upper()
+
+    @staticmethod
+    def record(counts, now=None):
+        """Add observations to bssid_gateway_macs (no commit; runs in the scan-ingest transaction)"""
+        now = now or datetime.datetime.utcnow()
+        for (bssid, gateway_mac), count in GatewayIndex._normalized(counts).items():
+            updated = db_session.query(BssidGatewayMac).filter(
+                BssidGatewayMac.bssid == bssid, BssidGatewayMac.gateway_mac == gateway_mac
+            ).update({
+                BssidGatewayMac.observations: BssidGatewayMac.observations + count,
+                BssidGatewayMac.last_seen: now
+            }, synchronize_session=False)
+            if not updated:
+                db_session.add(BssidGatewayMac(
+                    bssid=bssid, gateway_mac=gateway_mac, observations=count, first_seen=now, last_seen=now
+                ))
+
+    def apply(self, counts, now=None):
+        """Mirror committed observations into the cached entries (uncached BSSIDs load later)"""
+        now = now or datetime.datetime.utcnow()
+        with self._lock:
+            for (bssid, gateway_mac), count in self._normalized(counts).items():
+                entry = self.cache.get(bssid)
+                if entry is None:
+                    continue
+                seen = entry.setdefault(gateway_mac, [0, now])
+                seen[0] += count
+                seen[1] = now
+
+    @staticmethod
+    def rebuild():
+        """Recompute bssid_gateway_macs from every stored scan (backfill)"""
+        db_session.query(BssidGatewayMac).delete(synchronize_session=False)
+        rows = db_session.query(
+            WiFiScan.bssid, func.upper(WiFiScan.gateway_mac), func.count(WiFiScan.id),
+            func.min(WiFiScan.timestamp), func.max(WiFiScan.timestamp)
+        ).filter(
+            WiFiScan.gateway_mac.isnot(None), WiFiScan.gateway_mac != '',
+            WiFiScan.bssid.isnot(None), WiFiScan.bssid != UNKNOWN_BSSID
+        ).group_by(WiFiScan.bssid, func.upper(WiFiScan.gateway_mac))
+        # Stored BSSIDs are as the clients sent them; merge the groups per canonical BSSID
+        merged = {}
+        for bssid, gateway_mac, count, first_seen, last_seen in rows:
+            bssid = canonical_bssid(bssid)
+            if bssid is None:
+                continue
+            seen = merged.get((bssid, gateway_mac))
+            if seen is None:
+                merged[(bssid, gateway_mac)] = [count, first_seen, last_seen]
+            else:
+                seen[0] += count
+                seen[1] = min(seen[1], first_seen)
+                seen[2] = max(seen[2], last_seen)
+        for (bssid, gateway_mac), (count, first_seen, last_seen) in merged.items():
+            db_session.add(BssidGatewayMac(
+                bssid=bssid, gateway_mac=gateway_mac, observations=count,
+                first_seen=first_seen, last_seen=last_seen
+            ))
+        db_session.commit()
+
+    @staticmethod
+    def ensure():
+        """Backfill bssid_gateway_macs once for databases that predate the table"""
+        has_gateways = db_session.query(WiFiScan.id).filter(WiFiScan.gateway_mac.isnot(None)).first() is not None
+        has_rows = db_session.query(BssidGatewayMac.bssid).first() is not None
+        if has_gateways and not has_rows:
+            GatewayIndex.rebuild()
+
+    def stats(self):
+        return self.cache.stats()
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def gateway_index():
+    """Process-wide GatewayIndex shared by the API's RiskEngine, ScanRecorder and the ARP monitor"""
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = GatewayIndex()
+    return _shared
@@ -0,0 +1,100 @@
+# Request micro-batching for vectorized scoring functions
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+class MicroBatcher:
+    """
+    Collects items submitted from many threads for up to max_wait_ms (or
+    until max_batch items are waiting) and hands them to batch_fn in one call.
+    batch_fn(items) must return one result per item, in order. If it raises,
+    the items are retried one at a time and only the failing ones get the exception.
+    If it returns the wrong number of results, every caller of the batch gets a RuntimeError.
+    """
+
+    _STOP = object()
+
+    def __init__(self, batch_fn, max_batch=64, max_wait_ms=5, name='micro-batcher'):
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+        # Counters
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, item):
+        """Queue one item; returns a Future resolving to its result"""
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item, timeout=None):
+        """Submit and wait for the result"""
+        return self.submit(item).result(timeout)
+
+    def close(self):
+        self._queue.put(self._STOP)
+        self._thread.join()
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'avg_batch_size': round(self.items / self.batches, 2) if self.batches else 0.0
+        }
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is self._STOP:
+                return
+
+            batch = [first]
+            stopping = False
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if entry is self._STOP:
+                    stopping = True
+                    break
+                batch.append(entry)
+
+            self._dispatch(batch)
+            if stopping:
+                return
+
+    def _dispatch(self, batch):
+        items = [item for item, _ in batch]
+        try:
+            results = list(self.batch_fn(items))
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            # Retry one by one so a bad item only fails its own caller
+            for entry in batch:
+                self._dispatch([entry])
+            return
+
+        if len(results) != len(batch):
+            # zip() would silently leave the extra callers waiting forever
+            error = RuntimeError(f"batch_fn returned {len(results)} results for {len(batch)} items")
+            for _, future in batch:
+                future.set_exception(error)
+            return
+
+        self.batches += 1
+        self.items += len(batch)
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
@@ -0,0 +1,134 @@
+# Process-pool offload for CPU-bound XGBoost/SHAP work
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+# One detector per worker process, loaded by _init_worker
+_worker_detector = None
+
+
+def _init_worker(backend):
+    global _worker_detector
+    from ai_service import create_detector
+    _worker_detector = create_detector(backend)
+    _worker_detector.model  # Load the model before the first request arrives
+
+
+def _ping():
+    return True
+
+
+def _score_in_worker(features_list, explain):
+    from ai_service import score_features
+    return score_features(_worker_detector, features_list, explain)
+
+
+class MLPool:
+    """
+    Runs XGBoostDetector scoring and explanations in worker processes so a
+    slow SHAP call does not hold the GIL of the API process.
+
+    - At most max_pending calls are in flight; further calls are not queued
+      but answered immediately with the rules-only fallback.
+    - A call that takes longer than timeout seconds is answered with the
+      fallback too (the worker finishes it in the background).
+    Fallback results come from ml_engine.rules_only_risk and carry 'degraded': True.
+    """
+
+    def __init__(self, workers=2, max_pending=None, timeout=2.0, backend=None, start_method='spawn'):
+        self.workers = workers
+        self.max_pending = max_pending or workers * 4
+        self.timeout = timeout
+        self.backend = backend
+        self.start_method = start_method
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+
+        # Counters
+        self.submitted = 0
+        self.completed = 0
+        self.saturated = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def start(self):
+        """Spawn the workers and start loading their models (idempotent)"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_init_worker,
+                    initargs=(self.backend,)
+                )
+                # Workers start on demand; ping each so they all begin loading now
+                for _ in range(self.workers):
+                    self._executor.submit(_ping)
+        return self
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _restart(self, executor):
+        """Replace a broken executor (e.g. a worker was killed)"""
+        with self._lock:
+            if self._executor is executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+        self.start()
+
+    def _fallback(self, features_list, explain):
+        from ml_engine import rules_only_risk
+        return [rules_only_risk(features, explain) for features in features_list]
+
+    def analyze_batch(self, features_list, explain=True):
+        """Score (and optionally explain) feature dicts in a worker, or fall back to rules"""
+        if not features_list:
+            return []
+        if not self._slots.acquire(blocking=False):
+            self.saturated += 1
+            return self._fallback(features_list, explain)
+
+        executor = self.start()._executor
+        try:
+            future = executor.submit(_score_in_worker, list(features_list), explain)
+        except (BrokenProcessPool, RuntimeError) as e:
+            self._slots.release()
+            self.errors += 1
+            print(f"ML pool submit failed: {e}")
+            self._restart(executor)
+            return self._fallback(features_list, explain)
+
+        self.submitted += 1
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            results = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            self.timeouts += 1
+            return self._fallback(features_list, explain)
+        except BrokenProcessPool as e:
+            self.errors += 1
+            print(f"ML pool worker died: {e}")
+            self._restart(executor)
+            return self._fallback(features_list, explain)
+        self.completed += 1
+        return results
+
+    def stats(self):
+        """Counters are not locked, so values are approximate under concurrency"""
+        return {
+            'running': self._executor is not None,
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'timeout_ms': int(self.timeout * 1000),
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'saturated': self.saturated,
+            'timeouts': self.timeouts,
+            'errors': self.errors
+        }
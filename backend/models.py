@@ -130,6 +130,48 @@ class RiskLog(Base):
         self.ssid_analyzed = ssid
 
 
+class UserStats(Base):
+    __tablename__ = 'user_stats'
+    
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    scans_count = Column(Integer, default=0, nullable=False)
+    unique_networks = Column(Integer, default=0, nullable=False)
+    threats_found = Column(Integer, default=0, nullable=False)  # WARNING or DANGER scans
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+
+class UserSeenNetwork(Base):
+    __tablename__ = 'user_seen_bssids'
+    
+    # One row per (user, BSSID) pair; drives UserStats.unique_networks
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    bssid = Column(String(20), primary_key=True)
+    first_seen = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+class BssidSafety(Base):
+    __tablename__ = 'bssid_safety'
+
+    # Running safety score per router, folded from RiskLog.risk_score at ingest (see SafetyEngine)
+    bssid = Column(String(20), primary_key=True)
+    score = Column(Float, nullable=False)  # Exponentially weighted risk_score
+    trend = Column(Float, default=0.0, nullable=False)  # Exponentially weighted change per scan
+    scan_count = Column(Integer, default=0, nullable=False)
+    last_score = Column(Integer)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+
+class BssidGatewayMac(Base):
+    __tablename__ = 'bssid_gateway_macs'
+
+    # Gateway MACs reported for each router across all users (see GatewayIndex)
+    bssid = Column(String(20), primary_key=True)
+    gateway_mac = Column(String(20), primary_key=True)
+    observations = Column(Integer, default=0, nullable=False)
+    first_seen = Column(DateTime, default=datetime.datetime.utcnow)
+    last_seen = Column(DateTime, default=datetime.datetime.utcnow)
+
+
 # ============================================
 # Device Management
 # ============================================
@@ -210,7 +252,39 @@ class NetworkRating(Base):
     user = relationship('User', back_populates='ratings')
     
     __table_args__ = (
-        Index('idx_bssid_timestamp', 'bssid', 'timestamp'),
+        Index('idx_rating_bssid_timestamp', 'bssid', 'timestamp'),
+    )
+
+
+class NetworkRatingAggregate(Base):
+    __tablename__ = 'network_rating_aggregates'
+    
+    # Running counts/sums per rating dimension (only non-empty ratings are counted)
+    bssid = Column(String(20), primary_key=True)
+    total_ratings = Column(Integer, default=0, nullable=False)
+    safety_count = Column(Integer, default=0, nullable=False)
+    safety_sum = Column(Integer, default=0, nullable=False)
+    speed_count = Column(Integer, default=0, nullable=False)
+    speed_sum = Column(Integer, default=0, nullable=False)
+    reliability_count = Column(Integer, default=0, nullable=False)
+    reliability_sum = Column(Integer, default=0, nullable=False)
+
+
+class LeaderboardEntry(Base):
+    __tablename__ = 'leaderboard'
+    
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    points = Column(Integer, default=0, nullable=False)
+    scans_count = Column(Integer, default=0, nullable=False)
+    level = Column(Integer, default=1)
+    top_badge = Column(String(50))
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+    
+    # Relationships
+    user = relationship('User')
+    
+    __table_args__ = (
+        Index('idx_leaderboard_points', 'points'),
     )
 
 
@@ -1,17 +1,314 @@
 import difflib
+import os
+import threading
+import unicodedata
+from collections import Counter
+import numpy as np
+from cache_utils import LRUCache
+from domain_registry import DomainRegistry, url_host, verified_domains
+
+# check_url flags a domain whose SequenceMatcher ratio to an official one is above this
+SIMILARITY_THRESHOLD = 0.8
+
+# Registry category of the sites look-alike domains are checked against
+PROTECTED = 'protected'
+
+# Per-host verdicts kept by PhishingGuard.check_urls (size, seconds)
+VERDICT_CACHE_SIZE = int(os.getenv('PHISHING_CACHE_SIZE', 10000))
+VERDICT_CACHE_TTL = float(os.getenv('PHISHING_CACHE_TTL', 3600))
+
+# Characters that render like a Latin letter/digit in common fonts (subset of Unicode TR39
+# confusables). Fullwidth and mathematical letters are already folded by NFKD.
+CONFUSABLES = {
+    # Cyrillic
+    'а': 'a', 'в': 'b', 'е': 'e', 'ё': 'e', 'һ': 'h', 'і': 'i', 'ї': 'i', 'ј': 'j', 'к': 'k',
+    'ӏ': 'l', 'м': 'm', 'н': 'h', 'о': 'o', 'р': 'p', 'с': 'c', 'ѕ': 's', 'т': 't', 'у': 'y',
+    'х': 'x', 'ԁ': 'd', 'ԛ': 'q', 'ԝ': 'w', 'ү': 'y', 'ҫ': 'c', 'ɡ': 'g',
+    # Greek
+    'α': 'a', 'β': 'b', 'ε': 'e', 'η': 'n', 'ι': 'i', 'κ': 'k', 'ν': 'v', 'ο': 'o', 'ρ': 'p',
+    'τ': 't', 'υ': 'u', 'χ': 'x', 'ω': 'w',
+    # Armenian
+    'օ': 'o', 'ս': 'u', 'հ': 'h', 'ց': 'g', 'զ': 'q',
+    # Devanagari and other look-alike digits/letters
+    '०': 'o', '৪': '8', 'ı': 'i', 'ȷ': 'j', 'ℓ': 'l', 'ɩ': 'i', 'ʟ': 'l',
+    # Digits used for letters
+    '0': 'o', '1': 'l', '|': 'l',
+    # Dots that IDNA treats as label separators
+    '。': '.', '．': '.', '｡': '.',
+}
+
+# Letter pairs that read as one letter at small sizes
+CONFUSABLE_SEQUENCES = [('rn', 'm'), ('vv', 'w')]
+
+
+def _idna_decode(domain):
+    """Decode punycode labels (xn--...) to Unicode; undecodable labels are kept as-is"""
+    labels = []
+    for label in domain.split('.'):
+        if label.startswith('xn--'):
+            try:
+                label = label[4:].encode('ascii').decode('punycode')
+            except UnicodeError:
+                pass
+        labels.append(label)
+    return '.'.join(labels)
+
+
+def skeleton(domain):
+    """
+    Confusable skeleton of a domain: punycode decoded, lowercased, accents
+    stripped, look-alike characters folded to ASCII. Two domains that look
+    the same to a user have the same skeleton.
+    """
+    text = unicodedata.normalize('NFKD', _idna_decode(domain.lower()))
+    text = ''.join(CONFUSABLES.get(char, char) for char in text if not unicodedata.combining(char))
+    for sequence, replacement in CONFUSABLE_SEQUENCES:
+        text = text.replace(sequence, replacement)
+    return text
+
+
+def _lcs_length(masks, length, other):
+    """
+    Longest common subsequence of a string and `other` (bit-parallel, Hyyro 2004).
+    masks maps each character of the string to the bitmask of its positions.
+    """
+    full = (1 << length) - 1
+    v = full
+    for char in other:
+        u = v & masks.get(char, 0)
+        v = ((v + u) | (v - u)) & full
+    return length - bin(v).count('1')
+
+
+class DomainIndex:
+    """
+    Index over the protected domains, used to find every domain that could
+    have a SequenceMatcher ratio above SIMILARITY_THRESHOLD with a query
+    without comparing against all of them.
+
+    ratio = 2*M / T, where M is the number of matched characters and T = len(a) + len(b).
+    Each filter below is an upper bound on M, cheapest first:
+    - Length: M <= min(len(a), len(b)), so ratio > 0.8 needs 2/3*len(a) < len(b) < 3/2*len(a).
+    - Shared characters: M is at most the multiset character overlap (quick_ratio).
+    - Order: matched blocks are increasing in both strings, so M <= LCS(a, b).
+    Character counts are a (characters x domains) uint8 matrix whose columns
+    are sorted by domain length, so the length window is one contiguous slice
+    and the overlap bound is one vectorized pass per distinct query character.
+    Shared bigrams were tried as a first filter too, but protected domains
+    share a handful of suffixes (.gov.in, .nic.in, ...) and the bigrams of
+    the suffix alone let thousands of domains through at 100k entries.
+
+    The arrays are never modified in place: add() replaces them, so a copy()
+    can be extended and swapped in while other threads keep reading the old one.
+    """
+
+    def __init__(self, domains=()):
+        self.domains = list(domains)
+        self._alphabet = {}  # character -> row of _char_counts
+        rows = []  # Per domain: {row: count}
+        for domain in self.domains:
+            rows.append({
+                self._alphabet.setdefault(char, len(self._alphabet)): min(count, 255)
+                for char, count in Counter(domain).items()
+            })
+        lengths = np.fromiter((len(d) for d in self.domains), dtype=np.int32, count=len(self.domains))
+        self._order = np.argsort(lengths, kind='stable')  # Column -> domain index
+        self._lengths = lengths[self._order]
+        counts = np.zeros((len(self._alphabet), len(self.domains)), dtype=np.uint8)
+        for column, index in enumerate(self._order.tolist()):
+            for row, count in rows[index].items():
+                counts[row, column] = count  # Saturating keeps it an upper bound
+        self._char_counts = counts
+        self._set_starts()
+
+    def __len__(self):
+        return len(self.domains)
+
+    def _set_starts(self):
+        # starts[l] = first column with length >= l, so a length range is two list lookups
+        top = int(self._lengths[-1]) if len(self._lengths) else 0
+        self._starts = np.searchsorted(self._lengths, np.arange(top + 2)).tolist()
+
+    def copy(self):
+        """Index that can be add()ed to without affecting this one"""
+        other = DomainIndex.__new__(DomainIndex)
+        other.__dict__.update(self.__dict__)
+        other.domains = list(self.domains)
+        other._alphabet = dict(self._alphabet)
+        return other
+
+    def add(self, domain):
+        """Index one more domain (one column insert, no rebuild)"""
+        index = len(self.domains)
+        self.domains.append(domain)
+        counts = Counter(domain)
+        for char in counts:
+            self._alphabet.setdefault(char, len(self._alphabet))
+        matrix = self._char_counts
+        if len(self._alphabet) > matrix.shape[0]:
+            grown = np.zeros((len(self._alphabet), matrix.shape[1]), dtype=np.uint8)
+            grown[:matrix.shape[0]] = matrix
+            matrix = grown
+        column = np.zeros(matrix.shape[0], dtype=np.uint8)
+        for char, count in counts.items():
+            column[self._alphabet[char]] = min(count, 255)
+        # After the existing domains of the same length, as the stable sort would put it
+        position = int(np.searchsorted(self._lengths, len(domain), side='right'))
+        self._char_counts = np.insert(matrix, position, column, axis=1)
+        self._lengths = np.insert(self._lengths, position, len(domain))
+        self._order = np.insert(self._order, position, index)
+        self._set_starts()
+        return index
+
+    @staticmethod
+    def length_window(length):
+        """Inclusive range of lengths that can reach ratio > 0.8 with a string of this length"""
+        return (2 * length) // 3 + 1, (3 * length - 1) // 2
+
+    def _column_range(self, length):
+        starts = self._starts
+        return starts[min(length, len(starts) - 1)], starts[min(length + 1, len(starts) - 1)]
+
+    def candidates(self, query):
+        """Indexes (ascending) of domains that pass every bound and need a full ratio check"""
+        if not self.domains:
+            return []
+        length = len(query)
+        low, high = self.length_window(length)
+        if low > high:
+            return []
+        start, _ = self._column_range(low)
+        _, end = self._column_range(high)
+        if start >= end:
+            return []
+
+        # Shared characters: 2 * overlap / T > 0.8, where
+        # overlap = sum over characters c of min(count in domain, count in query)
+        #         = number of (c, k <= query count of c) with count in domain >= k
+        # (comparisons are several times faster than np.minimum on uint8)
+        overlap = np.zeros(end - start, dtype=np.uint16)
+        counts = self._char_counts
+        for char, count in Counter(query).items():
+            row = self._alphabet.get(char)
+            if row is not None:
+                window = counts[row, start:end]
+                for k in range(1, min(count, 255) + 1):
+                    overlap += window >= k
+        # Smallest overlap with 5 * overlap > 2T, per length bucket of the window
+        lengths = np.arange(low, high + 1)
+        sizes = np.diff([self._column_range(other)[0] for other in lengths] + [end])
+        needed = np.repeat((2 * (length + lengths)) // 5 + 1, sizes)
+        columns = np.flatnonzero(overlap >= needed)
+        if not len(columns):
+            return []
+        found = self._order[columns + start]
+
+        # Order: 2 * LCS / T > 0.8
+        masks = {}
+        for position, char in enumerate(query):
+            masks[char] = masks.get(char, 0) | (1 << position)
+        candidates = []
+        for index in found.tolist():
+            domain = self.domains[index]
+            if 5 * _lcs_length(masks, length, domain) > 2 * (length + len(domain)):
+                candidates.append(index)
+        candidates.sort()
+        return candidates
+
 
 class PhishingGuard:
-    def __init__(self):
-        self.official_sites = [
-            "mahadbt.gov.in",
-            "uidai.gov.in",
-            "sbi.co.in",
-            "onlinesbi.sbi",
-            "incometax.gov.in",
-            "cybercrime.gov.in",
-            "facebook.com",
-            "google.com"
-        ]
+    def __init__(self, official_sites=None, cache_size=None, cache_ttl=None, registry=None):
+        # Protected sites come from the shared verified-domain registry unless listed here
+        if official_sites is not None:
+            registry = DomainRegistry(entries=[(site, [PROTECTED]) for site in official_sites])
+        self.registry = registry or verified_domains()
+        # Serializes index rebuilds; lookups never take it
+        self._lock = threading.RLock()
+
+        # Bumped whenever the protected list changes; cached verdicts are keyed by it
+        self.version = 0
+        self.verdict_cache = LRUCache(
+            VERDICT_CACHE_SIZE if cache_size is None else cache_size,
+            ttl=VERDICT_CACHE_TTL if cache_ttl is None else cache_ttl
+        )
+        self._sync()
+
+    def _sync(self):
+        """
+        Rebuild the fuzzy and skeleton indexes from the registry's protected sites.
+        Each index is complete before it is published, so concurrent lookups
+        only ever read a finished one. Call with self._lock held.
+        """
+        registry_version = self.registry.version
+        official_sites = self.registry.domains(PROTECTED)
+        # skeleton -> first official site with it
+        skeletons = {}
+        for official in official_sites:
+            skeletons.setdefault(skeleton(official), official)
+        index = DomainIndex(official_sites)
+        self.official_sites = official_sites
+        self._official_set = set(official_sites)
+        self._skeletons = skeletons
+        self.index = index
+        self._registry_version = registry_version
+        self.version += 1
+        self.verdict_cache.clear()
+
+    def _refresh(self):
+        """Pick up registry changes (file reloads, entries added elsewhere)"""
+        self.registry.maybe_reload()
+        if self.registry.version != self._registry_version:
+            with self._lock:
+                if self.registry.version != self._registry_version:
+                    self._sync()
+
+    def add_official_site(self, domain):
+        """Protect one more domain (indexed immediately, cached verdicts dropped)"""
+        with self._lock:
+            self._refresh()
+            if domain not in self._official_set:
+                self.registry.add(domain, PROTECTED)
+                # Extend a copy of the index (no rebuild) and swap it in
+                index = self.index.copy()
+                index.add(domain)
+                skeletons = dict(self._skeletons)
+                skeletons.setdefault(skeleton(domain), domain)
+                self.official_sites = self.official_sites + [domain]
+                self._official_set = self._official_set | {domain}
+                self._skeletons = skeletons
+                self.index = index
+                self._registry_version = self.registry.version
+                self.version += 1
+                self.verdict_cache.clear()
+
+    @staticmethod
+    def host(url):
+        """Host part of a URL without scheme and www. (the cache key of check_urls)"""
+        return url.replace("https://", "").replace("http://", "").replace("www.", "").split('/')[0]
+
+    @staticmethod
+    def _phishing(clean_url, official, ratio, reason):
+        return {
+            "is_phishing": True,
+            "status": "PHISHING_DETECTED",
+            "target": official,
+            "similarity": round(ratio, 2),
+            "reason": reason,
+            "msg_mr": f"Savadha! '{clean_url}' he '{official}' sarkhe disat ahe (Fake Site)."
+        }
+
+    def _fuzzy_match(self, text):
+        """First official site with 0.8 < ratio < 1.0, checking only index candidates"""
+        # Candidates come back in list order, so the first hit is the same as a full scan's.
+        index = self.index
+        for position in index.candidates(text):
+            official = index.domains[position]
+            ratio = difflib.SequenceMatcher(None, text, official).ratio()
+            # If similarity is High (e.g. > 0.8) but NOT exact -> Phishing!
+            # e.g., "mahadbt.org.in" vs "mahadbt.gov.in"
+            if SIMILARITY_THRESHOLD < ratio < 1.0:
+                return official, ratio
+        return None, 0.0
 
     def check_url(self, url):
         """
@@ -19,25 +316,47 @@ class PhishingGuard:
         Returns: {'is_phishing': bool, 'target': str, 'similarity': float}
         """
         # Clean URL (remove http/https/www)
-        clean_url = url.replace("https://", "").replace("http://", "").replace("www.", "").split('/')[0]
-        
-        # Exact match = Safe (if it's in our list)
-        if clean_url in self.official_sites:
+        clean_url = self.host(url)
+
+        self._refresh()
+
+        # Verified domain (or a subdomain of one) = Safe
+        if self.registry.matches(url_host(clean_url)):
             return {"is_phishing": False, "status": "OFFICIAL"}
-            
-        # Check similarity
-        for official in self.official_sites:
-            ratio = difflib.SequenceMatcher(None, clean_url, official).ratio()
-            
-            # If similarity is High (e.g. > 0.8) but NOT exact -> Phishing!
-            # e.g., "mahadbt.org.in" vs "mahadbt.gov.in"
-            if 0.8 < ratio < 1.0:
-                return {
-                    "is_phishing": True,
-                    "status": "PHISHING_DETECTED",
-                    "target": official,
-                    "similarity": round(ratio, 2),
-                    "msg_mr": f"Savadha! '{clean_url}' he '{official}' sarkhe disat ahe (Fake Site)."
-                }
-                
+
+        # Look-alike characters / punycode: O(1) skeleton lookup
+        url_skeleton = skeleton(clean_url)
+        official = self._skeletons.get(url_skeleton)
+        if official is not None and official != clean_url.lower():
+            return self._phishing(clean_url, official, 1.0, "HOMOGLYPH")
+
+        # Fallback: typo-squatting, on the raw name and then on its skeleton
+        official, ratio = self._fuzzy_match(clean_url)
+        if official is None and url_skeleton != clean_url:
+            official, ratio = self._fuzzy_match(url_skeleton)
+        if official is not None:
+            return self._phishing(clean_url, official, ratio, "TYPO")
+
         return {"is_phishing": False, "status": "SAFE_OR_UNKNOWN"}
+
+    def check_urls(self, urls):
+        """
+        check_url for many URLs, one verdict per host: repeated hosts in the
+        batch and hosts seen recently are answered from verdict_cache.
+        Returns one result per URL, in order, each with its 'url'.
+        """
+        self._refresh()
+        version = self.version
+        verdicts = {}
+        results = []
+        for url in urls:
+            host = self.host(url)
+            verdict = verdicts.get(host)
+            if verdict is None:
+                verdict = self.verdict_cache.get((version, host))
+                if verdict is None:
+                    verdict = self.check_url(host)
+                    self.verdict_cache.put((version, host), verdict)
+                verdicts[host] = verdict
+            results.append({"url": url, **verdict})
+        return results
@@ -0,0 +1,78 @@
+# Running rating aggregates for community network ratings
+from models import NetworkRating, NetworkRatingAggregate
+from database import db_session
+from sqlalchemy import func
+
+class RatingAggregator:
+    """Keeps network_rating_aggregates in step with network_ratings"""
+    
+    DIMENSIONS = ['safety', 'speed', 'reliability']
+    
+    @staticmethod
+    def record(rating):
+        """Fold one new NetworkRating into its BSSID's aggregate (no commit)"""
+        values = {}
+        for dim in RatingAggregator.DIMENSIONS:
+            value = getattr(rating, f'{dim}_rating')
+            values[dim] = value if value else 0  # Empty/zero ratings are not averaged
+        
+        changes = {NetworkRatingAggregate.total_ratings: NetworkRatingAggregate.total_ratings + 1}
+        for dim, value in values.items():
+            count_col = getattr(NetworkRatingAggregate, f'{dim}_count')
+            sum_col = getattr(NetworkRatingAggregate, f'{dim}_sum')
+            changes[count_col] = count_col + (1 if value else 0)
+            changes[sum_col] = sum_col + value
+        
+        updated = db_session.query(NetworkRatingAggregate).filter(
+            NetworkRatingAggregate.bssid == rating.bssid
+        ).update(changes, synchronize_session=False)
+        
+        if not updated:
+            aggregate = NetworkRatingAggregate(bssid=rating.bssid, total_ratings=1)
+            for dim, value in values.items():
+                setattr(aggregate, f'{dim}_count', 1 if value else 0)
+                setattr(aggregate, f'{dim}_sum', value)
+            db_session.add(aggregate)
+    
+    @staticmethod
+    def summary(bssid, session=None):
+        """Averages and total for a BSSID from its aggregate row"""
+        session = session or db_session
+        aggregate = session.get(NetworkRatingAggregate, bssid)
+        
+        result = {'total_ratings': aggregate.total_ratings if aggregate else 0}
+        for dim in RatingAggregator.DIMENSIONS:
+            count = getattr(aggregate, f'{dim}_count') if aggregate else 0
+            total = getattr(aggregate, f'{dim}_sum') if aggregate else 0
+            result[f'average_{dim}'] = total / count if count else 0
+        return result
+    
+    @staticmethod
+    def rebuild():
+        """Recompute every aggregate from the raw ratings (backfill)"""
+        db_session.query(NetworkRatingAggregate).delete(synchronize_session=False)
+        
+        columns = [NetworkRating.bssid, func.count(NetworkRating.id)]
+        for dim in RatingAggregator.DIMENSIONS:
+            col = getattr(NetworkRating, f'{dim}_rating')
+            # NULL and 0 ratings are skipped, as in the original averages
+            columns.append(func.count(func.nullif(col, 0)))
+            columns.append(func.coalesce(func.sum(col), 0))
+        
+        for row in db_session.query(*columns).group_by(NetworkRating.bssid):
+            db_session.add(NetworkRatingAggregate(
+                bssid=row[0],
+                total_ratings=row[1],
+                safety_count=row[2], safety_sum=row[3],
+                speed_count=row[4], speed_sum=row[5],
+                reliability_count=row[6], reliability_sum=row[7]
+            ))
+        db_session.commit()
+    
+    @staticmethod
+    def ensure():
+        """Backfill aggregates once for databases that predate the table"""
+        has_ratings = db_session.query(NetworkRating.id).first() is not None
+        has_aggregates = db_session.query(NetworkRatingAggregate.bssid).first() is not None
+        if has_ratings and not has_aggregates:
+            RatingAggregator.rebuild()
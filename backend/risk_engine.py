@@ -1,6 +1,51 @@
+from risk_rules import default_registry
+from domain_registry import verified_domains
+from ssid_index import ssid_index
+
 class RiskEngine:
-    def __init__(self):
-        pass
+    # Defaults applied to missing input fields (shared by the scalar and batch paths)
+    DEFAULTS = {
+        'ssid': 'Unknown',
+        'encryption': 'WPA2',
+        'snr_db': 30,
+        'congestion_pct': 20,
+        'latency_ms': 20,
+        'bssid': '00:00:00:00:00:00',
+        'gateway_mac': 'AA:BB:CC:DD:EE:FF',
+        'broadcast_density': 0.05,
+        'target_url': '',
+        'dns_verified': None
+    }
+
+    # Verified-domain registry category of Government of India portals
+    GOI_CATEGORY = 'goi'
+
+    def __init__(self, registry=None, domains=None, gateways=None, ssids=None):
+        # Compile the rule chain once; extra rules must be registered on the
+        # registry before it is handed to the engine.
+        self.rules = (registry or default_registry()).compile()
+        # GOI portals come from the shared (file-backed, reloadable) DomainRegistry
+        self.domains = domains or verified_domains()
+        # Community gateway-MAC history per BSSID (MITM consensus signal). A
+        # GatewayIndex reads the database, so it is only used when passed in.
+        self.gateways = gateways
+        # SSID -> access point fingerprints (evil-twin signal)
+        self.ssids = ssids or ssid_index()
+
+    def _context(self, wifi_data):
+        """Scan fields with defaults filled in, plus derived flags used by the rules"""
+        ctx = dict(self.DEFAULTS)
+        ctx.update(wifi_data)
+        ctx['is_goi_portal'] = self.domains.matches_url(ctx['target_url'], self.GOI_CATEGORY)
+        # Only a reported gateway MAC is compared (not the default placeholder)
+        ctx['gateway_changed'] = self.gateways is not None and self.gateways.is_gateway_changed(
+            ctx['bssid'], wifi_data.get('gateway_mac')
+        )
+        ctx['twin_suspected'] = self.ssids.is_twin_suspected(
+            ctx['ssid'], ctx['bssid'], wifi_data.get('encryption'), wifi_data.get('channel'),
+            wifi_data.get('latitude'), wifi_data.get('longitude')
+        )
+        return ctx
 
     def analyze_wifi_network(self, wifi_data):
         """
@@ -18,106 +63,15 @@ class RiskEngine:
             'target_url': '...'
         }
         """
-        score = 100
-        alerts = []
+        ctx = self._context(wifi_data)
+        penalty, fired = self.rules.evaluate(ctx)
+        score = 100 - penalty
+        alerts = [dict(rule.alert) for rule in fired]
         
-        ssid = wifi_data.get('ssid', 'Unknown')
-        encryption = wifi_data.get('encryption', 'WPA2')
-        snr = wifi_data.get('snr_db', 30)
-        congestion = wifi_data.get('congestion_pct', 20)
-        latency = wifi_data.get('latency_ms', 20)
-        bssid = wifi_data.get('bssid', '00:00:00:00:00:00')
-        gateway_mac = wifi_data.get('gateway_mac', 'AA:BB:CC:DD:EE:FF')
-        broadcast_density = wifi_data.get('broadcast_density', 0.05)
-        target_url = wifi_data.get('target_url', '')
-
-        # 1. Physical Layer Integrity (Layer 1)
-        if snr < 15 and congestion > 70:
-            score -= 30
-            alerts.append({
-                "level": "CRITICAL",
-                "type": "PHYSICAL_LAYER",
-                "msg_en": "Suspicious signal interference detected (Low SNR).",
-                "msg_mr": "तुमच्या आजूबाजूला संशयास्पद सिग्नल आहे. सुरक्षिततेसाठी इंटरनेट बंद ठेवा."
-            })
-
-        # 2. Evil Twin Shield
-        # Simulated OUI check: If BSSID starts with '00:11:22' but latency > 100ms, flag spoofing
-        if bssid.startswith("00:11:22") and latency > 100:
-            score -= 40
-            alerts.append({
-                "level": "CRITICAL",
-                "type": "EVIL_TWIN",
-                "msg_en": "Evil Twin detected! This network is spoofed.",
-                "msg_mr": "हे वाय-फाय मुखवटा घातलेले (Duplicate) आहे. हॅकर तुमची माहिती बघत आहे."
-            })
-
-        # 3. MITM Defense (ARP Watchdog)
-        # Simulated ARP check: If gateway MAC is different from expected
-        if gateway_mac == "FF:EE:DD:CC:BB:AA": # Simulated attacker MAC
-            score -= 50
-            alerts.append({
-                "level": "CRITICAL",
-                "type": "MITM",
-                "msg_en": "Man-In-The-Middle attack detected!",
-                "msg_mr": "तुमची माहिती चोरणारा 'मध्यस्थ' आढळला आहे. व्यवहार ताबडतोब थांबवा!"
-            })
-
-        # 4. Vulnerability Meter (Packet Entropy)
-        if encryption == 'OPEN' or encryption == 'NONE':
-            score -= 40
-            alerts.append({
-                "level": "CRITICAL",
-                "type": "VULNERABILITY",
-                "msg_en": "Open network - Data is visible like glass.",
-                "msg_mr": "तुमची माहिती काचेसारखी आरपार दिसत आहे. कोणीही पाहू शकते."
-            })
-        elif broadcast_density > 0.4:
-            score -= 15
-            alerts.append({
-                "level": "MEDIUM",
-                "type": "VULNERABILITY",
-                "msg_en": "High broadcast traffic - increased sniffing risk.",
-                "msg_mr": "या नेटवर्कवर जास्त ट्रॅफिक आहे, माहिती चोरीचा धोका आहे."
-            })
-
-        # 5. DNS Integrity (Verified Stamp)
-        # GOI Whitelist simulation
-        goi_whitelist = ["uidai.gov.in", "prakash.gov.in", "pmkisan.gov.in"]
-        if any(site in target_url for site in goi_whitelist):
-            # Simulate DNS Hijacking
-            if wifi_data.get('dns_verified') == False:
-                score -= 60
-                alerts.append({
-                    "level": "CRITICAL",
-                    "type": "DNS_HIJACK",
-                    "msg_en": "Caution! This is not a real government website.",
-                    "msg_mr": "सावधान! ही खरी सरकारी वेबसाईट नाही. तुमचा आधार नंबर टाकू नका."
-                })
-            else:
-                alerts.append({
-                    "level": "INFO",
-                    "type": "VERIFIED_PORTAL",
-                    "msg_en": "Verified Government Portal.",
-                    "msg_mr": "हे अधिकृत सरकारी पोर्टल आहे."
-                })
-
-        # Baseline Rules
-        if encryption == 'WEP':
-            score -= 25
-            alerts.append({
-                "level": "HIGH",
-                "msg_en": "Old Security (WEP) - Easy to hack.",
-                "msg_mr": "जुन्या पद्धतीचे सुरक्षा लॉक (WEP) – हॅक करणे सोपे आहे."
-            })
-            
-        if "Free" in ssid or "Guest" in ssid:
-            score -= 10
-            alerts.append({
-                "level": "MEDIUM",
-                "msg_en": "Public/Guest Network.",
-                "msg_mr": "सार्वजनिक नेटवर्क – सावधगिरीने वापरा."
-            })
+        snr = ctx['snr_db']
+        congestion = ctx['congestion_pct']
+        latency = ctx['latency_ms']
+        broadcast_density = ctx['broadcast_density']
 
         status = "SAFE"
         if score < 40:
@@ -126,7 +80,7 @@ class RiskEngine:
             status = "WARNING"
             
         return {
-            "ssid": ssid,
+            "ssid": ctx['ssid'],
             "risk_score": max(0, score),
             "status": status,
             "alerts": alerts,
@@ -137,3 +91,87 @@ class RiskEngine:
                 "entropy": 1.0 - broadcast_density
             }
         }
+
+    def _column(self, columns, name, n):
+        """Fetch one input column as an array, filling in the scalar default if absent."""
+        import numpy as np
+        if name in columns:
+            return np.asarray(columns[name])
+        return np.full(n, self.DEFAULTS[name], dtype=object if self.DEFAULTS[name] is None else None)
+
+    def analyze_batch(self, columns):
+        """
+        Vectorized version of analyze_wifi_network.
+        Input: pandas DataFrame or dict of equal-length arrays with any of the
+               keys in RiskEngine.DEFAULTS (missing columns take the defaults),
+               plus optional precomputed 'gateway_changed' / 'twin_suspected'
+               bool columns and 'channel' / 'latitude' / 'longitude' columns.
+        Output: {
+            'risk_score': int array,
+            'status': str array,
+            'alert_mask': int array (bit i set => self.rules.codes[i] fired),
+            'telemetry': {'snr', 'congestion', 'latency', 'entropy'} arrays
+        }
+        Every rule is evaluated as a boolean mask over all rows; scores,
+        statuses and alerts match the scalar path row for row. Use
+        alerts_from_mask() to expand a row's alert_mask into alert dicts.
+        """
+        import numpy as np  # Only the batch path needs NumPy
+
+        present = [name for name in self.DEFAULTS if name in columns]
+        n = len(columns[present[0]]) if present else 0
+
+        cols = {name: self._column(columns, name, n) for name in self.DEFAULTS}
+        for name in ('ssid', 'bssid', 'target_url'):
+            cols[name] = cols[name].astype(str)
+        cols['dns_verified'] = cols['dns_verified'].astype(object)
+
+        # One registry lookup per distinct URL
+        urls, inverse = np.unique(cols['target_url'], return_inverse=True)
+        is_goi = np.array([self.domains.matches_url(url, self.GOI_CATEGORY) for url in urls], dtype=bool)
+        cols['is_goi_portal'] = is_goi[inverse.reshape(-1)]
+
+        # Gateway consensus: one index lookup per distinct (BSSID, gateway MAC) pair
+        if 'gateway_changed' in columns:
+            cols['gateway_changed'] = np.asarray(columns['gateway_changed'], dtype=bool)
+        elif 'gateway_mac' in columns and self.gateways is not None:
+            pairs = list(zip(cols['bssid'], cols['gateway_mac']))
+            changed = {pair: self.gateways.is_gateway_changed(*pair) for pair in set(pairs)}
+            cols['gateway_changed'] = np.array([changed[pair] for pair in pairs], dtype=bool)
+        else:
+            cols['gateway_changed'] = np.zeros(n, dtype=bool)
+
+        # SSID fingerprints: one index lookup per distinct scan fingerprint. Like the
+        # scalar path, missing ssid/bssid columns take the defaults (never suspected)
+        if 'twin_suspected' in columns:
+            cols['twin_suspected'] = np.asarray(columns['twin_suspected'], dtype=bool)
+        else:
+            encryption = columns['encryption'] if 'encryption' in columns else [None] * n
+            channel = columns['channel'] if 'channel' in columns else [None] * n
+            latitude = columns['latitude'] if 'latitude' in columns else [None] * n
+            longitude = columns['longitude'] if 'longitude' in columns else [None] * n
+            keys = list(zip(cols['ssid'], cols['bssid'], encryption, channel, latitude, longitude))
+            suspected = {key: self.ssids.is_twin_suspected(*key) for key in set(keys)}
+            cols['twin_suspected'] = np.array([suspected[key] for key in keys], dtype=bool)
+
+        penalty, alert_mask = self.rules.evaluate_batch(cols, n)
+        score = 100 - penalty
+
+        status = np.where(score < 40, "DANGER", np.where(score < 75, "WARNING", "SAFE"))
+
+        return {
+            "risk_score": np.maximum(0, score),
+            "status": status,
+            "alert_mask": alert_mask,
+            "telemetry": {
+                "snr": cols['snr_db'],
+                "congestion": cols['congestion_pct'],
+                "latency": cols['latency_ms'],
+                "entropy": 1.0 - cols['broadcast_density']
+            }
+        }
+
+    def alerts_from_mask(self, alert_mask):
+        """Expand one analyze_batch alert_mask value into the scalar path's alert list."""
+        alert_mask = int(alert_mask)
+        return [dict(rule.alert) for i, rule in enumerate(self.rules.rules) if alert_mask >> i & 1]
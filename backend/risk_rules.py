@@ -0,0 +1,287 @@
+# Declarative risk rules for RiskEngine
+import time
+
+# Simulated attacker MAC for the ARP watchdog
+ATTACKER_GATEWAY_MAC = "FF:EE:DD:CC:BB:AA"
+
+
+class Rule:
+    """
+    One risk check.
+    - predicate(ctx) -> bool, evaluated on a single scan context dict
+    - mask(cols) -> bool array, the same check over columnar arrays (optional)
+    - penalty: points subtracted from the score when the rule fires
+    - alert: alert template dict appended when the rule fires
+    - group: rules sharing a group are an if/elif chain; the first hit wins
+    """
+
+    def __init__(self, code, predicate, penalty, alert, mask=None, group=None):
+        self.code = code
+        self.predicate = predicate
+        self.mask = mask
+        self.penalty = penalty
+        self.alert = alert
+        self.group = group
+
+        # Counters (scraped via CompiledRules.stats)
+        self.evaluations = 0
+        self.hits = 0
+        self.total_ns = 0
+
+
+class RuleRegistry:
+    """Ordered collection of rules, compiled once into a CompiledRules evaluator"""
+
+    def __init__(self, rules=None):
+        self._rules = []
+        self._compiled = None
+        for rule in rules or []:
+            self.register(rule)
+
+    def register(self, rule):
+        """Add a rule after the existing ones. Must happen before compile()."""
+        if self._compiled is not None:
+            raise RuntimeError("Rule registry already compiled; register rules at startup")
+        if any(r.code == rule.code for r in self._rules):
+            raise ValueError(f"Duplicate rule code: {rule.code}")
+        self._rules.append(rule)
+        return rule
+
+    def compile(self):
+        """Freeze the rule order and group chains. Returns the same object on repeat calls."""
+        if self._compiled is None:
+            self._compiled = CompiledRules(self._rules)
+        return self._compiled
+
+
+class CompiledRules:
+    """Short-circuiting evaluator over a frozen list of rules"""
+
+    def __init__(self, rules):
+        self.rules = tuple(rules)
+        self.codes = tuple(rule.code for rule in self.rules)
+
+        # Consecutive rules with the same group collapse into one chain
+        chains = []
+        for rule in self.rules:
+            if rule.group is not None and chains and chains[-1][0].group == rule.group:
+                chains[-1].append(rule)
+            else:
+                chains.append([rule])
+        self.chains = tuple(tuple(chain) for chain in chains)
+
+    def evaluate(self, ctx):
+        """
+        Run every chain against one scan context.
+        Returns (total_penalty, fired_rules) with fired_rules in rule order.
+        """
+        clock = time.perf_counter_ns
+        penalty = 0
+        fired = []
+        for chain in self.chains:
+            for rule in chain:
+                start = clock()
+                hit = rule.predicate(ctx)
+                rule.total_ns += clock() - start
+                rule.evaluations += 1
+                if hit:
+                    rule.hits += 1
+                    penalty += rule.penalty
+                    fired.append(rule)
+                    break
+        return penalty, fired
+
+    def evaluate_batch(self, cols, n):
+        """
+        Vectorized evaluate over columnar arrays.
+        Returns (penalty array, alert_mask array) where bit i of alert_mask
+        means self.rules[i] fired for that row.
+        """
+        import numpy as np
+
+        penalty = np.zeros(n, dtype=np.int64)
+        alert_mask = np.zeros(n, dtype=np.int64)
+        bit = 0
+        for chain in self.chains:
+            taken = np.zeros(n, dtype=bool)
+            for rule in chain:
+                start = time.perf_counter_ns()
+                if rule.mask is not None:
+                    hit = np.asarray(rule.mask(cols), dtype=bool) & ~taken
+                else:
+                    # No vectorized form: fall back to the predicate row by row
+                    hit = np.array([
+                        not taken[i] and bool(rule.predicate({k: v[i] for k, v in cols.items()}))
+                        for i in range(n)
+                    ], dtype=bool)
+                rule.total_ns += time.perf_counter_ns() - start
+                rule.evaluations += int((~taken).sum())
+                rule.hits += int(hit.sum())
+                taken |= hit
+                penalty += hit * rule.penalty
+                alert_mask |= hit.astype(np.int64) << bit
+                bit += 1
+        return penalty, alert_mask
+
+    def stats(self):
+        """Per-rule counters. Updates are not locked, so values are approximate under concurrency."""
+        return [
+            {
+                'code': rule.code,
+                'penalty': rule.penalty,
+                'evaluations': rule.evaluations,
+                'hits': rule.hits,
+                'total_ms': round(rule.total_ns / 1e6, 3),
+                'avg_us': round(rule.total_ns / rule.evaluations / 1e3, 3) if rule.evaluations else 0.0
+            }
+            for rule in self.rules
+        ]
+
+    def reset_stats(self):
+        for rule in self.rules:
+            rule.evaluations = rule.hits = rule.total_ns = 0
+
+
+# Vectorized string helpers for rule masks (NumPy is only needed on the batch path)
+def _startswith(arr, prefix):
+    import numpy as np
+    return np.char.startswith(arr, prefix)
+
+
+def _contains_any(arr, words):
+    import numpy as np
+    found = np.zeros(len(arr), dtype=bool)
+    for word in words:
+        found |= np.char.find(arr, word) >= 0
+    return found
+
+
+def default_rules():
+    """Built-in rules, in the order their alerts are reported"""
+    return [
+        # 1. Physical Layer Integrity (Layer 1)
+        Rule(
+            'PHYSICAL_LAYER',
+            predicate=lambda c: c['snr_db'] < 15 and c['congestion_pct'] > 70,
+            mask=lambda c: (c['snr_db'] < 15) & (c['congestion_pct'] > 70),
+            penalty=30,
+            alert={
+                "level": "CRITICAL",
+                "type": "PHYSICAL_LAYER",
+                "msg_en": "Suspicious signal interference detected (Low SNR).",
+                "msg_mr": "तुमच्या आजूबाजूला संशयास्पद सिग्नल आहे. सुरक्षिततेसाठी इंटरनेट बंद ठेवा."
+            }
+        ),
+        # 2. Evil Twin Shield
+        # Simulated OUI check: If BSSID starts with '00:11:22' but latency > 100ms, flag spoofing.
+        # twin_suspected: the BSSID/vendor/encryption/channel does not match what this SSID is known for (SsidIndex)
+        Rule(
+            'EVIL_TWIN',
+            predicate=lambda c: (c['bssid'].startswith("00:11:22") and c['latency_ms'] > 100)
+                                or c.get('twin_suspected', False),
+            mask=lambda c: (_startswith(c['bssid'], "00:11:22") & (c['latency_ms'] > 100)) | c['twin_suspected'],
+            penalty=40,
+            alert={
+                "level": "CRITICAL",
+                "type": "EVIL_TWIN",
+                "msg_en": "Evil Twin detected! This network is spoofed.",
+                "msg_mr": "हे वाय-फाय मुखवटा घातलेले (Duplicate) आहे. हॅकर तुमची माहिती बघत आहे."
+            }
+        ),
+        # 3. MITM Defense (ARP Watchdog)
+        # Known attacker MAC, or a gateway that differs from the one other users see on this BSSID
+        Rule(
+            'MITM',
+            predicate=lambda c: c['gateway_mac'] == ATTACKER_GATEWAY_MAC or c.get('gateway_changed', False),
+            mask=lambda c: (c['gateway_mac'] == ATTACKER_GATEWAY_MAC) | c['gateway_changed'],
+            penalty=50,
+            alert={
+                "level": "CRITICAL",
+                "type": "MITM",
+                "msg_en": "Man-In-The-Middle attack detected!",
+                "msg_mr": "तुमची माहिती चोरणारा 'मध्यस्थ' आढळला आहे. व्यवहार ताबडतोब थांबवा!"
+            }
+        ),
+        # 4. Vulnerability Meter (Packet Entropy)
+        Rule(
+            'OPEN_NETWORK',
+            predicate=lambda c: c['encryption'] == 'OPEN' or c['encryption'] == 'NONE',
+            mask=lambda c: (c['encryption'] == 'OPEN') | (c['encryption'] == 'NONE'),
+            penalty=40,
+            group='VULNERABILITY',
+            alert={
+                "level": "CRITICAL",
+                "type": "VULNERABILITY",
+                "msg_en": "Open network - Data is visible like glass.",
+                "msg_mr": "तुमची माहिती काचेसारखी आरपार दिसत आहे. कोणीही पाहू शकते."
+            }
+        ),
+        Rule(
+            'HIGH_BROADCAST',
+            predicate=lambda c: c['broadcast_density'] > 0.4,
+            mask=lambda c: c['broadcast_density'] > 0.4,
+            penalty=15,
+            group='VULNERABILITY',
+            alert={
+                "level": "MEDIUM",
+                "type": "VULNERABILITY",
+                "msg_en": "High broadcast traffic - increased sniffing risk.",
+                "msg_mr": "या नेटवर्कवर जास्त ट्रॅफिक आहे, माहिती चोरीचा धोका आहे."
+            }
+        ),
+        # 5. DNS Integrity (Verified Stamp)
+        Rule(
+            'DNS_HIJACK',
+            predicate=lambda c: c['is_goi_portal'] and c['dns_verified'] == False,
+            mask=lambda c: c['is_goi_portal'] & (c['dns_verified'] == False),
+            penalty=60,
+            group='DNS',
+            alert={
+                "level": "CRITICAL",
+                "type": "DNS_HIJACK",
+                "msg_en": "Caution! This is not a real government website.",
+                "msg_mr": "सावधान! ही खरी सरकारी वेबसाईट नाही. तुमचा आधार नंबर टाकू नका."
+            }
+        ),
+        Rule(
+            'VERIFIED_PORTAL',
+            predicate=lambda c: c['is_goi_portal'],
+            mask=lambda c: c['is_goi_portal'],
+            penalty=0,
+            group='DNS',
+            alert={
+                "level": "INFO",
+                "type": "VERIFIED_PORTAL",
+                "msg_en": "Verified Government Portal.",
+                "msg_mr": "हे अधिकृत सरकारी पोर्टल आहे."
+            }
+        ),
+        # Baseline Rules
+        Rule(
+            'WEP',
+            predicate=lambda c: c['encryption'] == 'WEP',
+            mask=lambda c: c['encryption'] == 'WEP',
+            penalty=25,
+            alert={
+                "level": "HIGH",
+                "msg_en": "Old Security (WEP) - Easy to hack.",
+                "msg_mr": "जुन्या पद्धतीचे सुरक्षा लॉक (WEP) – हॅक करणे सोपे आहे."
+            }
+        ),
+        Rule(
+            'GUEST_NETWORK',
+            predicate=lambda c: "Free" in c['ssid'] or "Guest" in c['ssid'],
+            mask=lambda c: _contains_any(c['ssid'], ["Free", "Guest"]),
+            penalty=10,
+            alert={
+                "level": "MEDIUM",
+                "msg_en": "Public/Guest Network.",
+                "msg_mr": "सार्वजनिक नेटवर्क – सावधगिरीने वापरा."
+            }
+        ),
+    ]
+
+
+def default_registry():
+    """A fresh registry holding the built-in rules; register extra rules before compiling"""
+    return RuleRegistry(default_rules())
@@ -1,57 +1,160 @@
 from database import db_session
-from models import WiFiScan
-from sqlalchemy import desc
+from models import WiFiScan, RiskLog, BssidSafety
+import os
+import sys
 
 class SafetyEngine:
-    def calculate_historical_score(self, bssid):
+    """
+    Long-term safety score per router (BSSID), kept in bssid_safety.
+
+    Every analyzed scan folds its RiskLog.risk_score x into the row:
+        score <- score + ALPHA * (x - score)
+        trend <- trend + ALPHA * ((x - score) - trend)   (score before this scan)
+    so a read is one primary-key lookup however many scans a router has.
+    """
+
+    # Weight of the newest scan in the running score and trend
+    ALPHA = float(os.getenv('SAFETY_EWMA_ALPHA', 0.2))
+    # Trend (points per scan) beyond which a router is IMPROVING / DEGRADING
+    TREND_THRESHOLD = 5
+
+    @staticmethod
+    def legacy_score(encryption):
+        """Encryption-only score for old scans that have no RiskLog"""
+        if encryption == 'OPEN' or encryption == 'NONE':
+            return 60
+        if encryption == 'WEP':
+            return 75
+        return 100
+
+    @staticmethod
+    def fold(scores, alpha=None):
         """
-        Calculates a long-term safety score based on scan history.
-        Input: BSSID (MAC address of router)
-        Output: {'score': 0-100, 'trend': 'STABLE'|'IMPROVING'|'DEGRADING'}
+        Fold a BSSID's new scores (oldest first) into affine coefficients
+        (p, q, u, v, w) so that, for the stored score S and trend T,
+            new score = p*S + q
+            new trend = u*S + v*T + w
+        which lets one UPDATE apply a whole batch without reading the row first.
         """
-        # Get last 10 scans for this router
-        scans = db_session.query(WiFiScan).filter_by(bssid=bssid).order_by(desc(WiFiScan.timestamp)).limit(10).all()
-        
-        if not scans:
+        alpha = SafetyEngine.ALPHA if alpha is None else alpha
+        keep = 1.0 - alpha
+        p, q, u, v, w = 1.0, 0.0, 0.0, 1.0, 0.0
+        for x in scores:
+            u, v, w = keep * u - alpha * p, keep * v, keep * w + alpha * (x - q)
+            p, q = keep * p, keep * q + alpha * x
+        return p, q, u, v, w
+
+    @staticmethod
+    def new_row(bssid, scores):
+        """bssid_safety row for a router seen for the first time (seeded with its first score)"""
+        p, q, u, v, w = SafetyEngine.fold(scores[1:])
+        first = scores[0]
+        return BssidSafety(
+            bssid=bssid,
+            score=p * first + q,
+            trend=u * first + w,
+            scan_count=len(scores),
+            last_score=scores[-1]
+        )
+
+    @staticmethod
+    def record(scores_by_bssid):
+        """
+        Fold newly analyzed scans into bssid_safety (no commit; runs inside the
+        scan-ingest transaction). Input: {bssid: [risk_score, ...]} oldest first.
+        """
+        for bssid, scores in scores_by_bssid.items():
+            if not bssid:
+                continue
+            p, q, u, v, w = SafetyEngine.fold(scores)
+            # Right-hand sides see the old score/trend values
+            updated = db_session.query(BssidSafety).filter(BssidSafety.bssid == bssid).update({
+                BssidSafety.score: BssidSafety.score * p + q,
+                BssidSafety.trend: BssidSafety.score * u + BssidSafety.trend * v + w,
+                BssidSafety.scan_count: BssidSafety.scan_count + len(scores),
+                BssidSafety.last_score: scores[-1]
+            }, synchronize_session=False)
+
+            if not updated:
+                db_session.add(SafetyEngine.new_row(bssid, scores))
+
+    @staticmethod
+    def rebuild(chunk_size=5000):
+        """Recompute bssid_safety from every stored scan, oldest first (backfill)"""
+        db_session.query(BssidSafety).delete(synchronize_session=False)
+
+        rows = db_session.query(WiFiScan.bssid, WiFiScan.encryption, RiskLog.risk_score).outerjoin(
+            RiskLog, RiskLog.scan_id == WiFiScan.id
+        ).filter(WiFiScan.bssid.isnot(None)).order_by(
+            WiFiScan.bssid, WiFiScan.timestamp, WiFiScan.id
+        ).yield_per(chunk_size)
+
+        current, scores = None, []
+        for bssid, encryption, risk_score in rows:
+            if bssid != current:
+                if scores:
+                    db_session.add(SafetyEngine.new_row(current, scores))
+                current, scores = bssid, []
+            scores.append(risk_score if risk_score is not None else SafetyEngine.legacy_score(encryption))
+        if scores:
+            db_session.add(SafetyEngine.new_row(current, scores))
+        db_session.commit()
+
+    @staticmethod
+    def ensure():
+        """Backfill bssid_safety once for databases that predate the table"""
+        has_scans = db_session.query(WiFiScan.id).first() is not None
+        has_scores = db_session.query(BssidSafety.bssid).first() is not None
+        if has_scans and not has_scores:
+            SafetyEngine.rebuild()
+
+    @staticmethod
+    def describe(row):
+        """API view of a bssid_safety row (or of a router with no history)"""
+        if row is None:
             return {"score": 0, "trend": "UNKNOWN", "history_count": 0}
-        
-        # Calculate score for each past scan (re-using simplistic logic for now)
-        # Ideally we'd store the risk score in the DB with the scan, but we can re-compute or fetch from RiskLogs if linked.
-        # For this Phase, simple re-eval:
-        
-        scores = []
-        for scan in scans:
-            s_score = 100
-            if scan.encryption == 'OPEN' or scan.encryption == 'NONE':
-                s_score -= 40
-            elif scan.encryption == 'WEP':
-                s_score -= 25
-            scores.append(s_score)
-            
-        # Weighted Average: Recent scans count more
-        # Weights: [1.0, 0.9, 0.8, ...]
-        total_weight = 0
-        weighted_sum = 0
-        
-        for i, score in enumerate(scores):
-            weight = max(0.1, 1.0 - (i * 0.1)) # Decrease weight by 10% for each older scan
-            weighted_sum += score * weight
-            total_weight += weight
-            
-        final_score = int(weighted_sum / total_weight)
-        
-        # Determine Trend
+
         trend = "STABLE"
-        if len(scores) >= 2:
-            recent = scores[0]
-            older = sum(scores[1:]) / len(scores[1:])
-            if recent > older + 5:
+        if row.scan_count >= 2:
+            if row.trend > SafetyEngine.TREND_THRESHOLD:
                 trend = "IMPROVING 📈"
-            elif recent < older - 5:
+            elif row.trend < -SafetyEngine.TREND_THRESHOLD:
                 trend = "DEGRADING 📉"
-                
+
         return {
-            "score": final_score,
+            "score": int(round(row.score)),
             "trend": trend,
-            "history_count": len(scans)
+            "history_count": row.scan_count
         }
+
+    def calculate_historical_score(self, bssid, session=None):
+        """
+        Long-term safety score of a router from its bssid_safety row.
+        Input: BSSID (MAC address of router)
+        Output: {'score': 0-100, 'trend': 'STABLE'|'IMPROVING'|'DEGRADING', 'history_count': int}
+        """
+        session = session or db_session
+        return self.describe(session.get(BssidSafety, bssid))
+
+    def calculate_historical_scores(self, bssids, session=None):
+        """
+        calculate_historical_score for many routers with one primary-key IN query.
+        Output: {bssid: {'score', 'trend', 'history_count'}} for every requested BSSID
+        """
+        session = session or db_session
+        wanted = set(bssids)
+        rows = {}
+        if wanted:
+            rows = {row.bssid: row for row in session.query(BssidSafety).filter(BssidSafety.bssid.in_(wanted))}
+        return {bssid: self.describe(rows.get(bssid)) for bssid in bssids}
+
+
+if __name__ == '__main__':
+    # One-off backfill: python safety_engine.py rebuild
+    if len(sys.argv) >= 2 and sys.argv[1] == 'rebuild':
+        from database import init_db
+        init_db()
+        SafetyEngine.rebuild()
+        print(f"Rebuilt bssid_safety: {db_session.query(BssidSafety).count()} routers")
+    else:
+        print("Usage: python safety_engine.py rebuild")
@@ -0,0 +1,106 @@
+# Keyset-paginated scan history and streaming export
+import base64
+import csv
+import datetime
+import io
+import json
+from models import WiFiScan, RiskLog
+from sqlalchemy import or_, and_
+
+class ScanHistory:
+    """
+    Reads a user's scans newest first, ordered by (timestamp, id) so the
+    idx_user_timestamp index serves both the sort and the cursor seek.
+    """
+    
+    MAX_PAGE_SIZE = 200
+    EXPORT_BATCH_SIZE = 500
+    EXPORT_FIELDS = ['scan_id', 'timestamp', 'ssid', 'bssid', 'encryption', 'risk_score', 'status']
+    
+    @staticmethod
+    def encode_cursor(scan):
+        """Opaque cursor pointing just after this scan"""
+        raw = json.dumps([scan.timestamp.isoformat(), scan.id])
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+    
+    @staticmethod
+    def decode_cursor(cursor):
+        """Returns (timestamp, id); raises ValueError on a malformed cursor"""
+        try:
+            timestamp, scan_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            return datetime.datetime.fromisoformat(timestamp), int(scan_id)
+        except Exception:
+            raise ValueError('Invalid cursor')
+    
+    @staticmethod
+    def to_dict(scan, risk):
+        return {
+            'scan_id': scan.id,
+            'timestamp': scan.timestamp.isoformat(),
+            'ssid': scan.ssid,
+            'bssid': scan.bssid,
+            'encryption': scan.encryption,
+            'risk_score': risk.risk_score,
+            'status': risk.status
+        }
+    
+    @staticmethod
+    def _query(session, user_id):
+        return session.query(WiFiScan, RiskLog).join(RiskLog).filter(
+            WiFiScan.user_id == user_id
+        ).order_by(WiFiScan.timestamp.desc(), WiFiScan.id.desc())
+    
+    @staticmethod
+    def page(session, user_id, limit=50, cursor=None, offset=0):
+        """
+        One page of history after the given cursor.
+        Returns (rows, next_cursor); next_cursor is None on the last page.
+        offset is only for legacy clients and is ignored when a cursor is given.
+        """
+        limit = max(1, min(limit, ScanHistory.MAX_PAGE_SIZE))
+        query = ScanHistory._query(session, user_id)
+        
+        if cursor:
+            timestamp, scan_id = ScanHistory.decode_cursor(cursor)
+            query = query.filter(or_(
+                WiFiScan.timestamp < timestamp,
+                and_(WiFiScan.timestamp == timestamp, WiFiScan.id < scan_id)
+            ))
+        elif offset:
+            query = query.offset(offset)
+        
+        # Fetch one extra row to know whether another page exists
+        rows = query.limit(limit + 1).all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = ScanHistory.encode_cursor(rows[-1][0])
+        
+        return [ScanHistory.to_dict(scan, risk) for scan, risk in rows], next_cursor
+    
+    @staticmethod
+    def iter_rows(session, user_id):
+        """Stream every scan for a user without materializing the result"""
+        query = ScanHistory._query(session, user_id).execution_options(
+            stream_results=True
+        ).yield_per(ScanHistory.EXPORT_BATCH_SIZE)
+        for scan, risk in query:
+            yield ScanHistory.to_dict(scan, risk)
+    
+    @staticmethod
+    def export_ndjson(session, user_id):
+        for row in ScanHistory.iter_rows(session, user_id):
+            yield json.dumps(row, ensure_ascii=False) + '\n'
+    
+    @staticmethod
+    def export_csv(session, user_id):
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=ScanHistory.EXPORT_FIELDS)
+        writer.writeheader()
+        for row in ScanHistory.iter_rows(session, user_id):
+            writer.writerow(row)
+            if buffer.tell() > 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+        yield buffer.getvalue()
@@ -0,0 +1,140 @@
+# Scan persistence for Digital Guard
+import json
+import math
+from models import User, WiFiScan, RiskLog
+from database import db_session
+from gamification import GamificationEngine
+from safety_engine import SafetyEngine
+from gateway_index import GatewayIndex, gateway_index
+from ssid_index import SsidIndex, ssid_index
+
+class ScanRecorder:
+    """Builds and persists WiFiScan/RiskLog rows for analyzed networks"""
+
+    # Points awarded per scan
+    BASE_POINTS = 10
+    DANGER_BONUS = 20
+
+    # Optional telemetry copied from the request onto the scan row
+    OPTIONAL_FIELDS = ['snr_db', 'congestion_pct', 'latency_ms', 'gateway_mac', 'latitude', 'longitude', 'channel']
+    # Fields stored in numeric columns; anything else makes the whole transaction fail
+    NUMERIC_FIELDS = ['signal_dbm', 'snr_db', 'congestion_pct', 'latency_ms', 'latitude', 'longitude', 'channel']
+
+    @staticmethod
+    def points_for(result):
+        """Points a registered user earns for one analyzed scan"""
+        points = ScanRecorder.BASE_POINTS
+        if result['status'] == 'DANGER':
+            points += ScanRecorder.DANGER_BONUS  # Bonus for finding threats
+        return points
+
+    @staticmethod
+    def invalid_field(data):
+        """Name of the first field that cannot be stored (None if the scan is valid)"""
+        for field in ScanRecorder.NUMERIC_FIELDS:
+            value = data.get(field)
+            if value is None:
+                continue
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+                return field
+        if data.get('gateway_mac') is not None and not isinstance(data['gateway_mac'], str):
+            return 'gateway_mac'
+        return None
+
+    @staticmethod
+    def build_scan(data, user_id=None):
+        """Create (but do not add) a WiFiScan row from request data"""
+        scan = WiFiScan(
+            ssid=data.get('ssid'),
+            bssid=data.get('bssid', '00:00:00:00:00:00'),
+            encryption=data.get('encryption'),
+            signal_dbm=data.get('signal_dbm'),
+            user_id=user_id
+        )
+
+        for field in ScanRecorder.OPTIONAL_FIELDS:
+            if field in data:
+                setattr(scan, field, data[field])
+
+        return scan
+
+    @staticmethod
+    def record_scans(entries):
+        """
+        Persist many analyzed scans in a single transaction.
+        Input: list of (scan_data, risk_result, user_id) tuples
+        Output: list of {'scan_id': int, 'points_earned': int}, in input order
+
+        All WiFiScan rows are flushed together, then every RiskLog row, one
+        points/leaderboard/user_stats UPDATE per user and one bssid_safety and
+        bssid_gateway_macs UPDATE per router are written before a single commit.
+        The caller is responsible for rollback on failure.
+        """
+        if not entries:
+            return []
+
+        # Only award points to users that actually exist
+        user_ids = {user_id for _, _, user_id in entries if user_id}
+        known_users = set()
+        if user_ids:
+            known_users = {
+                row.id for row in db_session.query(User.id).filter(User.id.in_(user_ids))
+            }
+
+        scans = []
+        for data, _, user_id in entries:
+            scan = ScanRecorder.build_scan(data, user_id)
+            db_session.add(scan)
+            scans.append(scan)
+        db_session.flush()  # Assign all scan IDs in one round trip
+
+        records = []
+        points_by_user = {}
+        scans_by_user = {}
+        threats_by_user = {}
+        bssids_by_user = {}
+        scores_by_bssid = {}
+        for scan, (_, result, user_id) in zip(scans, entries):
+            risk_log = RiskLog(
+                scan_id=scan.id,
+                risk_score=result['risk_score'],
+                status=result['status'],
+                alerts_json=json.dumps(result['alerts']),
+                ssid=result['ssid']
+            )
+            risk_log.has_evil_twin = any(alert.get('type') == 'EVIL_TWIN' for alert in result['alerts'])
+            db_session.add(risk_log)
+            scores_by_bssid.setdefault(scan.bssid, []).append(result['risk_score'])
+
+            points_earned = 0
+            if user_id in known_users:
+                points_earned = ScanRecorder.points_for(result)
+                points_by_user[user_id] = points_by_user.get(user_id, 0) + points_earned
+                scans_by_user[user_id] = scans_by_user.get(user_id, 0) + 1
+                if result['status'] in GamificationEngine.THREAT_STATUSES:
+                    threats_by_user[user_id] = threats_by_user.get(user_id, 0) + 1
+                bssids_by_user.setdefault(user_id, set()).add(scan.bssid)
+
+            records.append({'scan_id': scan.id, 'points_earned': points_earned})
+
+        for user_id, points in points_by_user.items():
+            db_session.query(User).filter(User.id == user_id).update(
+                {User.points: User.points + points}, synchronize_session=False
+            )
+            GamificationEngine.record_leaderboard_activity(
+                user_id, points=points, scans=scans_by_user[user_id]
+            )
+            GamificationEngine.record_scan_stats(
+                user_id, scans_by_user[user_id], threats_by_user.get(user_id, 0), bssids_by_user[user_id]
+            )
+
+        SafetyEngine.record(scores_by_bssid)
+        gateways = GatewayIndex.pairs((scan.bssid, scan.gateway_mac) for scan in scans)
+        GatewayIndex.record(gateways)
+        # Plain tuples, because the commit expires the rows and reading them would reload each one
+        observations = SsidIndex.observations(scans, [result for _, result, _ in entries])
+
+        db_session.commit()
+        gateway_index().apply(gateways)
+        ssid_index().observe_scans(observations)
+        return records
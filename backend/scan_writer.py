@@ -0,0 +1,157 @@
+# Write-behind persistence for analyzed scans
+import queue
+import threading
+import time
+from database import db_session
+from scan_recorder import ScanRecorder
+
+class ScanWriter:
+    """
+    Background writer that drains a bounded queue of analyzed scans and
+    persists them with group commits (one ScanRecorder transaction per drain).
+
+    Each submission is a list of (scan_data, risk_result, user_id) entries.
+    When the writer is not running, or the queue stays full for put_timeout
+    seconds, submit() returns False so the caller can fall back to a
+    synchronous write.
+    """
+
+    _STOP = object()
+
+    def __init__(self, max_queue=1000, max_batch=200, flush_interval=0.05, put_timeout=0.5):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+
+        # Counters (updated under _counter_lock: request threads and the writer both count)
+        self._counter_lock = threading.Lock()
+        self.submitted = 0
+        self.written = 0
+        self.failed = 0
+        self.rejected = 0
+        self.commits = 0
+
+    def start(self):
+        """Start the writer thread (idempotent)"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='scan-writer', daemon=True)
+                self._thread.start()
+        return self
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _count(self, name, amount=1):
+        with self._counter_lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def submit(self, entries):
+        """Queue entries for persistence. Returns False if not running or the queue stayed full."""
+        entries = list(entries)
+        if not self.running:
+            # Nothing would drain the queue (never started, stopped or crashed)
+            self._count('rejected', len(entries))
+            return False
+        try:
+            self._queue.put(entries, timeout=self.put_timeout)
+        except queue.Full:
+            self._count('rejected', len(entries))
+            return False
+        self._count('submitted', len(entries))
+        return True
+
+    def close(self, timeout=10):
+        """Flush everything queued so far and stop the writer thread (waits at most ~timeout seconds)"""
+        if not self.running:
+            return
+        deadline = time.monotonic() + timeout
+        try:
+            # The writer may be stuck on a hung commit with the queue full
+            self._queue.put(self._STOP, timeout=timeout)
+        except queue.Full:
+            print(f"Scan writer did not stop: queue still full after {timeout}s")
+            return
+        self._thread.join(max(0, deadline - time.monotonic()))
+
+    def stats(self):
+        with self._counter_lock:
+            return {
+                'running': self.running,
+                'queued': self._queue.qsize(),
+                'submitted': self.submitted,
+                'written': self.written,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'commits': self.commits
+            }
+
+    def _run(self):
+        try:
+            stopping = False
+            while not stopping:
+                first = self._queue.get()
+                if first is self._STOP:
+                    break
+
+                # Gather more submissions for a short window to share one commit
+                groups = [first]
+                pending = len(first)
+                deadline = time.monotonic() + self.flush_interval
+                while pending < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if item is self._STOP:
+                        stopping = True
+                        break
+                    groups.append(item)
+                    pending += len(item)
+
+                self._write(groups)
+
+            # Drain whatever is left after the stop marker
+            leftover = []
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not self._STOP:
+                    leftover.append(item)
+            if leftover:
+                self._write(leftover)
+        finally:
+            db_session.remove()
+
+    def _write(self, groups):
+        entries = [entry for group in groups for entry in group]
+        try:
+            ScanRecorder.record_scans(entries)
+            with self._counter_lock:
+                self.written += len(entries)
+                self.commits += 1
+            return
+        except Exception as e:
+            print(f"Scan writer error: {e}")
+            db_session.rollback()
+
+        # Retry submission by submission so one bad row does not drop the rest
+        for group in groups:
+            try:
+                ScanRecorder.record_scans(group)
+                with self._counter_lock:
+                    self.written += len(group)
+                    self.commits += 1
+            except Exception as e:
+                print(f"Scan writer dropped {len(group)} scan(s): {e}")
+                db_session.rollback()
+                self._count('failed', len(group))
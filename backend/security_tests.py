@@ -63,17 +63,28 @@ class SecurityTests:
         return result
     
     @staticmethod
-    def arp_monitor_test(current_gateway_mac, previous_gateway_mac=None):
+    def arp_monitor_test(current_gateway_mac, previous_gateway_mac=None, consensus=None):
         """
         Test for ARP spoofing
         Checks if gateway MAC address has changed (MITM indicator)
+        Without a previous_gateway_mac from the client, compares against the
+        network's community consensus (GatewayIndex.consensus) if there is one.
         """
         is_spoofed = False
         confidence = 0.0
+        baseline = None
         
-        if previous_gateway_mac and current_gateway_mac != previous_gateway_mac:
-            is_spoofed = True
-            confidence = 0.85  # High confidence if MAC changed
+        if previous_gateway_mac:
+            baseline = 'client'
+            if current_gateway_mac != previous_gateway_mac:
+                is_spoofed = True
+                confidence = 0.85  # High confidence if MAC changed
+        elif consensus:
+            baseline = 'community'
+            previous_gateway_mac = consensus['gateway_mac']
+            if current_gateway_mac.upper() != previous_gateway_mac:
+                is_spoofed = True
+                confidence = round(0.85 * consensus['share'], 2)  # As sure as the community agrees
         
         result = {
             'test_type': 'ARP_SPOOF',
@@ -81,6 +92,7 @@ class SecurityTests:
             'is_spoofed': is_spoofed,
             'current_gateway_mac': current_gateway_mac,
             'previous_gateway_mac': previous_gateway_mac,
+            'baseline': baseline,
             'confidence': confidence,
             'severity': 'CRITICAL' if is_spoofed else 'LOW',
             'message': 'Gateway MAC changed! Possible MITM attack.' if is_spoofed else 'Gateway MAC is consistent',
@@ -0,0 +1,238 @@
+# SSID -> access point fingerprint index for evil-twin detection
+import datetime
+import operator
+import os
+import threading
+from array import array
+from database import db_session
+from models import WiFiScan, RiskLog
+
+# An SSID's fingerprint is trusted once it has this many observations
+TWIN_MIN_OBSERVATIONS = int(os.getenv('TWIN_MIN_OBSERVATIONS', 5))
+# SSIDs with more distinct BSSIDs than this are generic names ("JioFi", "Home") and never flagged
+TWIN_MAX_BSSIDS = int(os.getenv('TWIN_MAX_BSSIDS', 256))
+# Location cell size in degrees (0.01 ~ 1.1 km)
+LOCATION_CELL_DEG = float(os.getenv('TWIN_CELL_DEG', 0.01))
+# A flagged new BSSID joins its SSID's fingerprint (replaced router, mesh node) once it has been
+# seen TWIN_TRUST_SIGHTINGS times over at least TWIN_TRUST_HOURS without a gap longer than that,
+# or by TWIN_TRUST_USERS different registered users. Evil twins are short-lived; real APs stay.
+TWIN_TRUST_SIGHTINGS = int(os.getenv('TWIN_TRUST_SIGHTINGS', 5))
+TWIN_TRUST_WINDOW = datetime.timedelta(hours=float(os.getenv('TWIN_TRUST_HOURS', 24)))
+TWIN_TRUST_USERS = int(os.getenv('TWIN_TRUST_USERS', 3))
+
+# Placeholder BSSID given to scans that did not report one
+UNKNOWN_BSSID = '00:00:00:00:00:00'
+
+
+def pack_bssid(bssid):
+    """'AA:BB:CC:DD:EE:FF' (or '-', '.' separated) -> 48-bit int; None if malformed"""
+    if not isinstance(bssid, str):
+        return None
+    digits = bssid.replace(':', '').replace('-', '').replace('.', '')
+    if len(digits) != 12:
+        return None
+    try:
+        return int(digits, 16)
+    except ValueError:
+        return None
+
+
+def channel_bit(channel):
+    """Bit of a Wi-Fi channel number in a channel mask; 0 if missing or out of range"""
+    if isinstance(channel, bool):
+        return 0
+    try:
+        channel = operator.index(channel)  # Also NumPy integers
+    except TypeError:
+        return 0
+    return 1 << channel if 0 < channel < 256 else 0
+
+
+def location_cell(latitude, longitude):
+    """Packed grid cell of a position; None without coordinates"""
+    if latitude is None or longitude is None:
+        return None
+    try:
+        row = int(round((float(latitude) + 90) / LOCATION_CELL_DEG))
+        col = int(round((float(longitude) + 180) / LOCATION_CELL_DEG))
+    except (TypeError, ValueError, OverflowError):  # Also NaN / inf
+        return None
+    return row * 100000 + col
+
+
+class _Fingerprint:
+    """Everything seen for one SSID; BSSIDs/OUIs/cells as packed integer arrays"""
+
+    __slots__ = ('observations', 'bssids', 'ouis', 'cells', 'channels', 'encryptions', 'pending')
+
+    def __init__(self):
+        self.observations = 0
+        self.bssids = array('Q')  # 48-bit BSSIDs
+        self.ouis = array('I')  # 24-bit vendor prefixes
+        self.cells = array('Q')  # location_cell values
+        self.channels = 0  # Bit c set => channel c seen
+        self.encryptions = ()
+        self.pending = None  # Flagged new BSSID -> [sightings, first_seen, last_seen, user ids]
+
+    def add(self, bssid, encryption, channel, cell):
+        self.observations += 1
+        # Stops one past the cap, which marks the SSID as generic
+        if bssid is not None and bssid not in self.bssids and len(self.bssids) <= TWIN_MAX_BSSIDS:
+            self.bssids.append(bssid)
+            if bssid >> 24 not in self.ouis:
+                self.ouis.append(bssid >> 24)
+            if self.pending:
+                self.pending.pop(bssid, None)
+        if encryption and encryption not in self.encryptions:
+            self.encryptions += (encryption,)
+        self.channels |= channel_bit(channel)
+        if cell is not None and cell not in self.cells and len(self.cells) < TWIN_MAX_BSSIDS:
+            self.cells.append(cell)
+
+    def near(self, cell):
+        """True if cell is a known cell or adjacent to one"""
+        return any(cell + dr * 100000 + dc in self.cells for dr in (-1, 0, 1) for dc in (-1, 0, 1))
+
+    def sight(self, bssid, user_id, seen_at):
+        """Count a flagged sighting of a new BSSID; True once it has earned a place in the fingerprint"""
+        if self.pending is None:
+            self.pending = {}
+        record = self.pending.get(bssid)
+        if record is None or seen_at - record[2] > TWIN_TRUST_WINDOW:  # New, or gone quiet: start over
+            if record is None and len(self.pending) >= TWIN_MAX_BSSIDS:
+                return False
+            record = self.pending[bssid] = [0, seen_at, seen_at, ()]
+        record[0] += 1
+        record[2] = max(record[2], seen_at)
+        if user_id is not None and user_id not in record[3]:
+            record[3] += (user_id,)
+        steady = record[0] >= TWIN_TRUST_SIGHTINGS and record[2] - record[1] >= TWIN_TRUST_WINDOW
+        return steady or len(record[3]) >= TWIN_TRUST_USERS
+
+
+class SsidIndex:
+    """
+    SSID -> fingerprint of the access points seen broadcasting it: BSSIDs
+    (packed 48-bit ints), vendor OUIs, channels, encryption types and
+    ~1 km location cells.
+
+    A scan is a suspected evil twin when its SSID is established (at least
+    TWIN_MIN_OBSERVATIONS scans, not a generic name), its BSSID has never been
+    seen for that SSID, it is near where the SSID is usually seen (or reports
+    no location), and its vendor OUI, encryption type or channel is new for
+    the SSID. Every check is a dict lookup plus scans of small bounded arrays.
+    Scans flagged as evil twins are not learned right away, so a short-lived
+    clone does not become part of the fingerprint it is imitating; a flagged
+    BSSID that keeps being seen (see TWIN_TRUST_*) is learned after all.
+    """
+
+    def __init__(self):
+        self._fingerprints = {}
+        self._lock = threading.Lock()
+        self.observations = 0
+
+    def observe(self, ssid, bssid, encryption=None, channel=None, latitude=None, longitude=None,
+                flagged=False, user_id=None, seen_at=None):
+        """
+        Add one scan to its SSID's fingerprint. A flagged scan (one that fired
+        EVIL_TWIN) only counts towards trusting its BSSID, unless that makes it trusted.
+        """
+        if not ssid or bssid == UNKNOWN_BSSID:
+            return
+        packed = pack_bssid(bssid)
+        with self._lock:
+            fingerprint = self._fingerprints.get(ssid)
+            if fingerprint is None:
+                fingerprint = self._fingerprints[ssid] = _Fingerprint()
+            if flagged:
+                if packed is None or packed in fingerprint.bssids:
+                    return
+                if not fingerprint.sight(packed, user_id, seen_at or datetime.datetime.utcnow()):
+                    return
+            fingerprint.add(packed, encryption, channel, location_cell(latitude, longitude))
+            self.observations += 1
+
+    @staticmethod
+    def observations(scans, results):
+        """
+        (ssid, bssid, encryption, channel, latitude, longitude, flagged, user_id, timestamp)
+        tuples for flushed WiFiScan rows; read before the commit expires the rows
+        """
+        return [
+            (scan.ssid, scan.bssid, scan.encryption, scan.channel, scan.latitude, scan.longitude,
+             any(alert.get('type') == 'EVIL_TWIN' for alert in result.get('alerts', [])),
+             scan.user_id, scan.timestamp)
+            for scan, result in zip(scans, results)
+        ]
+
+    def observe_scans(self, observations):
+        """Learn from freshly stored scans, given as observations() tuples"""
+        for *scan, flagged, user_id, seen_at in observations:
+            self.observe(*scan, flagged=flagged, user_id=user_id, seen_at=seen_at)
+
+    def is_twin_suspected(self, ssid, bssid, encryption=None, channel=None, latitude=None, longitude=None):
+        """True if this scan does not fit the established fingerprint of its SSID"""
+        if not ssid or bssid == UNKNOWN_BSSID:
+            return False  # No BSSID reported: nothing to compare (observe() skips these too)
+        fingerprint = self._fingerprints.get(ssid)
+        if fingerprint is None or fingerprint.observations < TWIN_MIN_OBSERVATIONS:
+            return False
+        if len(fingerprint.bssids) > TWIN_MAX_BSSIDS:
+            return False
+        packed = pack_bssid(bssid)
+        if packed is None or packed in fingerprint.bssids:
+            return False
+        cell = location_cell(latitude, longitude)
+        if cell is not None and fingerprint.cells and not fingerprint.near(cell):
+            return False  # Same name somewhere else: a different network, not a clone
+        new_vendor = packed >> 24 not in fingerprint.ouis
+        new_encryption = bool(encryption) and encryption not in fingerprint.encryptions
+        # Only once the SSID has reported channels, and only for scans that report one
+        bit = channel_bit(channel)
+        new_channel = bool(bit and fingerprint.channels) and not fingerprint.channels & bit
+        return new_vendor or new_encryption or new_channel
+
+    def fingerprint(self, ssid):
+        """Readable fingerprint of an SSID (None if never seen)"""
+        fingerprint = self._fingerprints.get(ssid)
+        if fingerprint is None:
+            return None
+        return {
+            'observations': fingerprint.observations,
+            'bssids': ['%012X' % b for b in fingerprint.bssids],
+            'ouis': ['%06X' % o for o in fingerprint.ouis],
+            'channels': [c for c in range(256) if fingerprint.channels >> c & 1],
+            'encryptions': list(fingerprint.encryptions),
+            'location_cells': len(fingerprint.cells),
+            'pending_bssids': ['%012X' % b for b in fingerprint.pending or ()]
+        }
+
+    def rebuild(self, chunk_size=10000):
+        """Rebuild from every stored scan, replaying evil-twin flags from RiskLog.has_evil_twin"""
+        fresh = SsidIndex()
+        rows = db_session.query(
+            WiFiScan.ssid, WiFiScan.bssid, WiFiScan.encryption, WiFiScan.channel,
+            WiFiScan.latitude, WiFiScan.longitude, RiskLog.has_evil_twin, WiFiScan.user_id, WiFiScan.timestamp
+        ).outerjoin(RiskLog, RiskLog.scan_id == WiFiScan.id).order_by(WiFiScan.id).yield_per(chunk_size)
+        for *scan, flagged, user_id, seen_at in rows:
+            fresh.observe(*scan, flagged=bool(flagged), user_id=user_id, seen_at=seen_at)
+        with self._lock:
+            self._fingerprints = fresh._fingerprints
+            self.observations = fresh.observations
+        return self
+
+    def stats(self):
+        return {'ssids': len(self._fingerprints), 'observations': self.observations}
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def ssid_index():
+    """Process-wide SsidIndex shared by RiskEngine and ScanRecorder"""
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = SsidIndex()
+    return _shared
@@ -0,0 +1,86 @@
+# Cold-start benchmark for the API process
+# Usage: python startup_benchmark.py [top_n]
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Modules that must not be loaded just by importing app.py
+HEAVY_MODULES = ['numpy', 'pandas', 'xgboost', 'shap', 'sklearn', 'fpdf']
+
+# Runs in a fresh interpreter so nothing is already cached in sys.modules
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.app.test_client().get('/health')
+ready = time.perf_counter()
+print('IMPORT_MS', (imported - start) * 1000)
+print('HEALTH_MS', (ready - imported) * 1000, response.status_code)
+print('LOADED', ','.join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def parse_importtime(stderr):
+    """Lines of `python -X importtime` -> [(cumulative_us, self_us, depth, module)]"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        depth = (len(module) - len(module.lstrip()) - 1) // 2
+        rows.append((int(cumulative_us), int(self_us), depth, module.strip()))
+    return rows
+
+
+def direct_imports(rows, parent):
+    """Modules imported directly by `parent` (importtime lists children before their parent)"""
+    children = []
+    for row in rows:
+        if row[2] == 0:
+            if row[3] == parent:
+                return children
+            children = []
+        elif row[2] == 1:
+            children.append(row)
+    return []
+
+
+def run(top_n=20):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE.format(heavy=HEAVY_MODULES)],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        print(result.stderr)
+        sys.exit(result.returncode)
+
+    info = {}
+    for line in result.stdout.splitlines():
+        key, _, value = line.partition(' ')
+        info[key] = value
+
+    rows = parse_importtime(result.stderr)
+
+    print("\n⏱️  --- API COLD START --- ⏱️\n")
+    print(f"import app:        {float(info['IMPORT_MS']):8.1f} ms")
+    health_ms, status = info['HEALTH_MS'].split()
+    print(f"first /health:     {float(health_ms):8.1f} ms (HTTP {status})")
+    print(f"modules imported:  {len(rows)}")
+    print(f"heavy deps loaded: {info.get('LOADED') or 'none'}")
+
+    print(f"\nSlowest {top_n} imports made by app.py (cumulative):")
+    for cumulative_us, self_us, _, module in sorted(direct_imports(rows, 'app'), reverse=True)[:top_n]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  (self {self_us / 1000:6.1f} ms)  {module}")
+
+    print(f"\nSlowest {top_n} modules (self time):")
+    for cumulative_us, self_us, _, module in sorted(rows, key=lambda row: row[1], reverse=True)[:top_n]:
+        print(f"  {self_us / 1000:8.1f} ms  {module}")
+
+    return info
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -1,5 +1,5 @@
 from ml_engine import XGBoostDetector
-from phishing_guard import PhishingGuard
+from phishing_guard import PhishingGuard, skeleton
 from report_gen import generate_complaint_pdf
 import os
 
@@ -21,6 +21,32 @@ explanation = detector.explain_risk(fake_features)
 
 print(f"Risk Score: {score}/100")
 print(f"Reason (Marathi): {explanation['explanation_mr']}")
+
+# Native and NumPy explanation modes must agree with shap
+for mode in ('native', 'numpy'):
+    other = XGBoostDetector(explain_mode=mode).explain_risk(fake_features)
+    assert other['top_factor'] == explanation['top_factor'], mode
+    assert other['explanation_mr'] == explanation['explanation_mr'], mode
+    print(f"Explain mode '{mode}': {other['top_factor']} ✓")
+
+# NumPy TreeSHAP must match the booster's own contributions, including missing values
+import numpy as np
+import xgboost as xgb
+rows = np.random.RandomState(1).rand(200, 5).astype(np.float32)
+rows[::7, 2] = np.nan
+native = detector.model.get_booster().predict(xgb.DMatrix(rows), pred_contribs=True)[:, :-1]
+assert np.abs(detector.tree_ensemble.contributions(rows) - native).max() < 1e-4
+print("NumPy TreeSHAP matches pred_contribs ✓")
+
+# Exported NumPy trees must score like the booster
+from ml_engine import CompiledDetector
+import tempfile
+tree_path = detector.export_trees(os.path.join(tempfile.mkdtemp(), 'trees.npz'))
+compiled = CompiledDetector(tree_path)
+compiled_score = compiled.predict_risk(fake_features)
+assert abs(compiled_score - score) <= 1, (compiled_score, score)
+assert compiled.explain_risk(fake_features)['top_factor'] == explanation['top_factor']
+print(f"Compiled trees score: {compiled_score}/100 ✓")
 print("--------------------------------------------------")
 
 # 2. Test Phishing Guard
@@ -36,6 +62,53 @@ if res_fake.get('msg_mr'):
 
 res_real = guard.check_url(url_real)
 print(f"URL: {url_real} -> {res_real['status']}")
+
+# The index must give the same first match as a full difflib scan
+import difflib
+import random
+random.seed(0)
+for _ in range(2000):
+    site = list(random.choice(guard.official_sites))
+    for _ in range(random.randint(0, 3)):
+        site.insert(random.randrange(len(site) + 1), random.choice("abcdefgilnorstuv.-0"))
+        del site[random.randrange(len(site))]
+    candidate = "".join(site)
+    expected = next((o for o in guard.official_sites
+                     if 0.8 < difflib.SequenceMatcher(None, candidate, o).ratio() < 1.0), None)
+    # Skip names the confusable fold changes (those go through the skeleton lookup)
+    if not guard.registry.matches(candidate) and skeleton(candidate) == candidate:
+        assert guard.check_url(candidate).get('target') == expected, candidate
+print("Indexed matching agrees with full scan ✓")
+
+# Look-alike characters and punycode resolve to the protected domain
+for spoof in ("mаhadbt.gov.in", "xn--mhadbt-3nf.gov.in", "g00gle.com", "incornetax.gov.in"):
+    res = guard.check_url(spoof)
+    print(f"URL: {spoof} -> {res['status']} ({res.get('reason')}, {res.get('target')})")
+assert guard.check_url("xn--mhadbt-3nf.gov.in").get('reason') == "HOMOGLYPH"
+assert guard.check_url("MAHADBT.gov.in")['status'] != "PHISHING_DETECTED"
+
+# Batch check: one verdict per host, dropped when the protected list changes
+batch = guard.check_urls(["https://mahadbt.org.in/apply", "http://www.mahadbt.org.in/", "mahadbt.org.in"])
+assert all(r['is_phishing'] for r in batch) and guard.verdict_cache.stats()['misses'] == 1
+guard.add_official_site("mahadbt.org.in")
+assert guard.check_urls(["mahadbt.org.in"])[0]['status'] == "OFFICIAL"
+print(f"Batch check cache: {guard.verdict_cache.stats()} ✓")
+
+# Verified-domain registry file is picked up at runtime
+from domain_registry import DomainRegistry
+registry_path = os.path.join(tempfile.mkdtemp(), 'verified_domains.txt')
+with open(registry_path, 'w') as f:
+    f.write("mahadbt.gov.in protected\n*.nic.in goi\n")
+registry = DomainRegistry(registry_path, reload_interval=0)
+file_guard = PhishingGuard(registry=registry)
+assert registry.matches("portal.nic.in", "goi") and not registry.matches("nic.in")
+assert file_guard.check_url("uidai.gov.ln")['status'] == "SAFE_OR_UNKNOWN"
+with open(registry_path, 'a') as f:
+    f.write("uidai.gov.in goi,protected\n")
+os.utime(registry_path, ns=(0, os.stat(registry_path).st_mtime_ns + 1))
+assert file_guard.check_url("uidai.gov.ln").get('target') == "uidai.gov.in"
+assert file_guard.check_url("https://resident.uidai.gov.in/")['status'] == "OFFICIAL"
+print(f"Registry reload: {len(registry)} entries ✓")
 print("--------------------------------------------------")
 
 # 3. Test PDF Report
@@ -62,6 +62,21 @@ def test_scan_analyze(token=None):
     print(f"Status: {response.status_code}")
     print(f"Response: {json.dumps(response.json(), indent=2)}\n")
 
+def test_scan_analyze_batch(token=None):
+    """Test batch network scan analysis"""
+    print("Testing batch network scan analysis...")
+    data = {
+        "scans": [
+            {"ssid": "Cafe_Free_WiFi", "bssid": "11:22:33:44:55:66", "encryption": "OPEN", "signal_dbm": -55},
+            {"ssid": "Home_Net", "bssid": "AA:BB:CC:DD:EE:01", "encryption": "WPA2", "signal_dbm": -70},
+            {"ssid": "Old_Router", "bssid": "AA:BB:CC:DD:EE:02", "encryption": "WEP", "signal_dbm": -80}
+        ]
+    }
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    response = requests.post(f"{BASE_URL}/api/scan/analyze-batch", json=data, headers=headers)
+    print(f"Status: {response.status_code}")
+    print(f"Response: {json.dumps(response.json(), indent=2)}\n")
+
 def test_scan_history(token):
     """Test scan history"""
     print("Testing scan history...")
@@ -89,6 +104,7 @@ if __name__ == "__main__":
     if token:
         test_profile(token)
         test_scan_analyze(token)
+        test_scan_analyze_batch(token)
         test_scan_history(token)
     
     # Test anonymous scan
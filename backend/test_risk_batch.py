@@ -0,0 +1,79 @@
+import random
+from risk_engine import RiskEngine
+from ssid_index import SsidIndex
+
+def random_scan():
+    """Build one random scan dict that exercises every rule"""
+    scan = {
+        "ssid": random.choice(["Sai_Home", "CyberCafe_Free", "Om_Guest", "JioFiber"]),
+        "encryption": random.choice(["WPA2", "WPA3", "WEP", "OPEN", "NONE"]),
+        "snr_db": random.randint(0, 40),
+        "congestion_pct": random.randint(0, 100),
+        "latency_ms": random.randint(5, 200),
+        "bssid": random.choice(["00:11:22:AA:BB:CC", "74:FF:9C:24:35:87"]),
+        "gateway_mac": random.choice(["AA:BB:CC:DD:EE:FF", "FF:EE:DD:CC:BB:AA"]),
+        "broadcast_density": round(random.random() * 0.6, 2),
+        "target_url": random.choice(["", "https://uidai.gov.in/aadhaar", "https://example.com"]),
+        "dns_verified": random.choice([True, False, None])
+    }
+    return scan
+
+def test_batch_matches_scalar():
+    engine = RiskEngine()
+    random.seed(7)
+    scans = [random_scan() for _ in range(2000)]
+
+    columns = {key: [scan[key] for scan in scans] for key in scans[0]}
+    batch = engine.analyze_batch(columns)
+
+    mismatches = 0
+    for i, scan in enumerate(scans):
+        expected = engine.analyze_wifi_network(scan)
+        if (int(batch['risk_score'][i]) != expected['risk_score']
+                or batch['status'][i] != expected['status']
+                or engine.alerts_from_mask(batch['alert_mask'][i]) != expected['alerts']):
+            mismatches += 1
+
+    print(f"Compared {len(scans)} scans, mismatches: {mismatches} (Should be 0)")
+    assert mismatches == 0
+
+def test_batch_defaults():
+    engine = RiskEngine()
+    batch = engine.analyze_batch({"ssid": ["Free_WiFi"], "encryption": ["OPEN"]})
+    expected = engine.analyze_wifi_network({"ssid": "Free_WiFi", "encryption": "OPEN"})
+    print(f"Batch: {batch['risk_score'][0]} {batch['status'][0]} | Scalar: {expected['risk_score']} {expected['status']}")
+    assert int(batch['risk_score'][0]) == expected['risk_score']
+
+def test_batch_matches_scalar_with_ssid_history():
+    # Established fingerprints, so evil-twin lookups (and the missing-BSSID default) are exercised
+    ssids = SsidIndex()
+    for ssid in ["Sai_Home", "CyberCafe_Free", "Om_Guest", "JioFiber"]:
+        for _ in range(5):
+            ssids.observe(ssid, "74:FF:9C:24:35:87", "WPA2", 6)
+    engine = RiskEngine(ssids=ssids)
+    random.seed(11)
+    scans = [random_scan() for _ in range(500)]
+    for scan in scans:
+        scan["channel"] = random.choice([6, 11])
+        scan["bssid"] = random.choice(["00:11:22:AA:BB:CC", "74:FF:9C:24:35:87", "F0:9F:C2:00:00:01"])
+    columns = {key: [scan[key] for scan in scans] for key in scans[0]}
+    no_bssid = {key: values for key, values in columns.items() if key != "bssid"}
+
+    mismatches = 0
+    for cols, strip in ((columns, False), (no_bssid, True)):
+        batch = engine.analyze_batch(cols)
+        for i, scan in enumerate(scans):
+            if strip:
+                scan = {key: value for key, value in scan.items() if key != "bssid"}
+            expected = engine.analyze_wifi_network(scan)
+            if (int(batch['risk_score'][i]) != expected['risk_score']
+                    or engine.alerts_from_mask(batch['alert_mask'][i]) != expected['alerts']):
+                mismatches += 1
+
+    print(f"With SSID history, mismatches: {mismatches} (Should be 0)")
+    assert mismatches == 0
+
+if __name__ == "__main__":
+    test_batch_matches_scalar()
+    test_batch_defaults()
+    test_batch_matches_scalar_with_ssid_history()
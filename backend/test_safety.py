@@ -1,26 +1,35 @@
 from database import db_session, init_db
-from models import WiFiScan
+from models import WiFiScan, BssidSafety
 from safety_engine import SafetyEngine
+from scan_recorder import ScanRecorder
+from risk_engine import RiskEngine
+from gateway_index import GatewayIndex, gateway_index
+from models import BssidGatewayMac
+from ssid_index import ssid_index
+import datetime
 import time
 
 print("🧪 Testing Cyber Safety Score Logic...")
 
 # Initialize DB (ensure it's fresh enough or just append)
-# init_db() 
+init_db()
 
 engine = SafetyEngine()
+risk_engine = RiskEngine(gateways=gateway_index())
 test_bssid = "AA:BB:CC:DD:EE:FF"
 
+def record(scans):
+    """Analyze and persist scans the way /api/scan/analyze-batch does"""
+    ScanRecorder.record_scans([(scan, risk_engine.analyze_wifi_network(scan), None) for scan in scans])
+
 # 1. Clear old test data
 db_session.query(WiFiScan).filter_by(bssid=test_bssid).delete()
+db_session.query(BssidSafety).filter_by(bssid=test_bssid).delete()
 db_session.commit()
 
 # 2. Add 3 "Bad" Scans (History)
 print("Adding 3 BAD scans (OPEN)...")
-for i in range(3):
-    scan = WiFiScan(ssid="Village_WiFi", bssid=test_bssid, encryption="OPEN", signal_dbm=-60)
-    db_session.add(scan)
-db_session.commit()
+record([{"ssid": "Village_WiFi", "bssid": test_bssid, "encryption": "OPEN", "signal_dbm": -60}] * 3)
 
 # Check Score
 result = engine.calculate_historical_score(test_bssid)
@@ -29,14 +38,102 @@ print(f"Score after BAD scans: {result['score']} (Should be low ~60)")
 # 3. Add 2 "Good" Scans (Fixed to WPA2)
 print("Adding 2 GOOD scans (WPA2)...")
 for i in range(2):
-    # Small sleep to ensure timestamp diff? (Not strictly needed if granularity is high, but good for order)
-    scan = WiFiScan(ssid="Village_WiFi_Secure", bssid=test_bssid, encryption="WPA2", signal_dbm=-60)
-    db_session.add(scan)
-db_session.commit()
+    record([{"ssid": "Village_WiFi_Secure", "bssid": test_bssid, "encryption": "WPA2", "signal_dbm": -60}])
 
 # Check Score
 result = engine.calculate_historical_score(test_bssid)
 print(f"Score after IMPROVEMENT: {result['score']} (Should be higher)")
 print(f"Trend: {result['trend']}")
 
+# 4. The backfill job must arrive at the same running score
+before = db_session.get(BssidSafety, test_bssid)
+before = (before.score, before.trend, before.scan_count)
+SafetyEngine.rebuild()
+after = db_session.get(BssidSafety, test_bssid)
+assert all(abs(a - b) < 1e-9 for a, b in zip(before, (after.score, after.trend, after.scan_count))), (before, after)
+print(f"Backfill matches incremental score: {result['score']} ✓")
+
+# 5. Many routers in one call (network list screen)
+scores = engine.calculate_historical_scores([test_bssid, "00:11:22:33:44:55"])
+assert scores[test_bssid] == engine.calculate_historical_score(test_bssid)
+print(f"Bulk scores: {scores}")
+
+# 6. Gateway consensus: other users' scans flag a changed gateway on the same BSSID
+print("Adding 5 scans with the usual gateway...")
+cafe_bssid = "AA:BB:CC:00:00:01"
+db_session.query(WiFiScan).filter_by(bssid=cafe_bssid).delete()
+db_session.query(BssidGatewayMac).filter_by(bssid=cafe_bssid).delete()
+db_session.commit()
+record([{"ssid": "Cafe", "bssid": cafe_bssid, "encryption": "WPA2", "gateway_mac": "10:20:30:40:50:60"}] * 5)
+assert gateway_index().consensus(cafe_bssid)['gateway_mac'] == "10:20:30:40:50:60"
+spoofed = risk_engine.analyze_wifi_network(
+    {"ssid": "Cafe", "bssid": cafe_bssid, "encryption": "WPA2", "gateway_mac": "66:55:44:33:22:11"}
+)
+usual = risk_engine.analyze_wifi_network(
+    {"ssid": "Cafe", "bssid": cafe_bssid, "encryption": "WPA2", "gateway_mac": "10:20:30:40:50:60"}
+)
+assert any(a.get('type') == 'MITM' for a in spoofed['alerts'])
+assert not any(a.get('type') == 'MITM' for a in usual['alerts'])
+print(f"Changed gateway -> {spoofed['status']} (MITM) | usual gateway -> {usual['status']} ✓")
+
+# The same router written in another format by another client
+dashed_bssid = cafe_bssid.lower().replace(':', '-')
+assert gateway_index().consensus(dashed_bssid)['observations'] == 5
+assert gateway_index().is_gateway_changed(dashed_bssid, "66:55:44:33:22:11")
+assert not gateway_index().is_gateway_changed(dashed_bssid, "10:20:30:40:50:60".lower())
+assert GatewayIndex.pairs([(dashed_bssid, "10:20:30:40:50:60")]) == {(cafe_bssid, "10:20:30:40:50:60"): 1}
+
+# Backfill gives the same counts, and a fresh index reads them from the DB
+GatewayIndex.rebuild()
+assert GatewayIndex().consensus(cafe_bssid)['observations'] == 5
+
+# 7. Evil twin: a new BSSID from another vendor broadcasting an established SSID
+print("Adding 5 scans of the real cafe access point...")
+ssid_index().rebuild()
+twin_ssid = "Chai_Point_Free_%d" % int(time.time())
+record([{"ssid": twin_ssid, "bssid": "74:FF:9C:24:35:87", "encryption": "WPA2",
+         "latitude": 18.5204, "longitude": 73.8567}] * 5)
+real = risk_engine.analyze_wifi_network(
+    {"ssid": twin_ssid, "bssid": "74:FF:9C:24:35:87", "encryption": "WPA2", "latitude": 18.5205, "longitude": 73.8566}
+)
+clone = risk_engine.analyze_wifi_network(
+    {"ssid": twin_ssid, "bssid": "DE:AD:BE:EF:00:01", "encryption": "OPEN", "latitude": 18.5205, "longitude": 73.8566}
+)
+elsewhere = risk_engine.analyze_wifi_network(
+    {"ssid": twin_ssid, "bssid": "DE:AD:BE:EF:00:01", "encryption": "WPA2", "latitude": 19.0760, "longitude": 72.8777}
+)
+assert not any(a.get('type') == 'EVIL_TWIN' for a in real['alerts'])
+assert any(a.get('type') == 'EVIL_TWIN' for a in clone['alerts'])
+assert not any(a.get('type') == 'EVIL_TWIN' for a in elsewhere['alerts'])
+# A scan that reports no BSSID gets the placeholder, which is not a new access point
+no_bssid = risk_engine.analyze_wifi_network({"ssid": twin_ssid, "encryption": "WPA2"})
+assert not any(a.get('type') == 'EVIL_TWIN' for a in no_bssid['alerts'])
+print(f"Known AP -> {real['status']} | clone -> {clone['status']} (EVIL_TWIN) | other city -> {elsewhere['status']} ✓")
+
+# The flagged clone is stored but not learned, also after a rebuild
+record([{"ssid": twin_ssid, "bssid": "DE:AD:BE:EF:00:01", "encryption": "OPEN", "latitude": 18.5205, "longitude": 73.8566}])
+assert ssid_index().rebuild().is_twin_suspected(twin_ssid, "DE:AD:BE:EF:00:01", "OPEN")
+print(f"Fingerprint: {ssid_index().fingerprint(twin_ssid)}")
+
+# Channels are part of the fingerprint once the SSID reports them
+record([{"ssid": twin_ssid, "bssid": "74:FF:9C:24:35:87", "encryption": "WPA2", "channel": 6}])
+assert ssid_index().is_twin_suspected(twin_ssid, "74:FF:9C:00:00:02", "WPA2", 11)
+assert not ssid_index().is_twin_suspected(twin_ssid, "74:FF:9C:00:00:02", "WPA2", 6)
+
+# A replaced router is trusted once it keeps being seen for a day; a burst of sightings is not enough
+index = ssid_index()
+start = datetime.datetime(2026, 1, 1)
+for ssid in ("Cafe_Replaced", "Cafe_Burst"):
+    for _ in range(5):
+        index.observe(ssid, "74:FF:9C:24:35:87", "WPA2", seen_at=start)
+for hour in range(0, 30, 6):
+    index.observe("Cafe_Replaced", "F0:9F:C2:00:00:01", "WPA2", flagged=True,
+                  seen_at=start + datetime.timedelta(hours=hour))
+for minute in range(100):
+    index.observe("Cafe_Burst", "F0:9F:C2:00:00:01", "WPA2", flagged=True,
+                  seen_at=start + datetime.timedelta(minutes=minute))
+assert not index.is_twin_suspected("Cafe_Replaced", "F0:9F:C2:00:00:01", "WPA2")
+assert index.is_twin_suspected("Cafe_Burst", "F0:9F:C2:00:00:01", "WPA2")
+print("Replaced router trusted after a day ✓ | burst of sightings still flagged ✓")
+
 db_session.remove()
@@ -0,0 +1,249 @@
+# Flat NumPy representation of a trained XGBoost tree ensemble
+import json
+import math
+import os
+import numpy as np
+
+class TreeEnsemble:
+    """
+    All trees of a binary:logistic booster flattened into parallel arrays.
+    Node i of the ensemble has:
+      feature[i], threshold[i]   split (go left when x < threshold)
+      left[i], right[i]          absolute child indices (-1 for leaves)
+      default_left[i]            direction for missing (NaN) values
+      value[i]                   leaf value (0 for split nodes)
+      cover[i]                   sum of hessians reaching the node
+    roots[t] is the index of tree t's root node.
+    Needs only NumPy, so it can be used without importing xgboost or shap.
+    """
+
+    ARRAYS = ('feature', 'threshold', 'left', 'right', 'default_left', 'value', 'cover', 'roots')
+
+    def __init__(self, feature, threshold, left, right, default_left, value, cover, roots,
+                 base_margin, n_features, meta=None):
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float32)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.cover = np.asarray(cover, dtype=np.float64)
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.base_margin = float(base_margin)
+        self.n_features = int(n_features)
+        self.meta = dict(meta or {})  # Free-form string metadata saved alongside the arrays
+        self._paths = None  # Per-leaf TreeSHAP tables, see _leaf_paths()
+
+    @classmethod
+    def from_booster(cls, booster):
+        """Export an xgboost Booster (or XGBClassifier) via its JSON model dump"""
+        if hasattr(booster, 'get_booster'):
+            booster = booster.get_booster()
+        return cls.from_model_json(json.loads(booster.save_raw('json')))
+
+    @classmethod
+    def from_model_json(cls, model):
+        learner = model['learner']
+        objective = learner['objective']['name']
+        if objective != 'binary:logistic':
+            raise ValueError(f"Unsupported objective: {objective}")
+
+        params = learner['learner_model_param']
+        base_score = float(str(params['base_score']).strip('[]'))
+        base_margin = math.log(base_score / (1.0 - base_score))
+
+        feature, threshold, left, right, default_left, value, cover, roots = ([] for _ in range(8))
+        for tree in learner['gradient_booster']['model']['trees']:
+            offset = len(feature)
+            roots.append(offset)
+            lefts = tree['left_children']
+            for node, child in enumerate(lefts):
+                is_leaf = child == -1
+                feature.append(0 if is_leaf else tree['split_indices'][node])
+                threshold.append(0.0 if is_leaf else tree['split_conditions'][node])
+                left.append(-1 if is_leaf else offset + child)
+                right.append(-1 if is_leaf else offset + tree['right_children'][node])
+                default_left.append(bool(tree['default_left'][node]))
+                # Leaf weights (learning rate already applied) live in split_conditions
+                value.append(tree['split_conditions'][node] if is_leaf else 0.0)
+                cover.append(tree['sum_hessian'][node])
+
+        return cls(feature, threshold, left, right, default_left, value, cover, roots,
+                   base_margin, int(params['num_feature']))
+
+    @classmethod
+    def load(cls, path):
+        """Read an ensemble written by save()"""
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in cls.ARRAYS}
+            meta = {key[len('meta_'):]: str(data[key]) for key in data.files if key.startswith('meta_')}
+            return cls(base_margin=float(data['base_margin']), n_features=int(data['n_features']),
+                       meta=meta, **arrays)
+
+    def save(self, path):
+        """Write the arrays and metadata to an .npz file (atomically replaced)"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = os.path.join(directory, '.tmp-' + os.path.basename(path))
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, base_margin=self.base_margin, n_features=self.n_features,
+                     **{name: getattr(self, name) for name in self.ARRAYS},
+                     **{'meta_' + key: str(value) for key, value in self.meta.items()})
+        os.replace(tmp_path, path)
+        return path
+
+    def _goes_left(self, node, column):
+        """Row mask of samples that take the left branch at a split node"""
+        missing = np.isnan(column)
+        return np.where(missing, self.default_left[node], column < self.threshold[node])
+
+    # ============================================
+    # Prediction
+    # ============================================
+
+    def leaves(self, X):
+        """Leaf reached in every tree by every row, shape (n, n_trees)"""
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(X.shape[0])[:, None]
+        node = np.broadcast_to(self.roots, (X.shape[0], len(self.roots))).copy()
+        # Advance all (row, tree) pairs one level per step until every one sits on a leaf
+        while True:
+            active = self.left[node] != -1
+            if not active.any():
+                return node
+            values = X[rows, self.feature[node]]
+            goes_left = np.where(np.isnan(values), self.default_left[node], values < self.threshold[node])
+            node = np.where(active, np.where(goes_left, self.left[node], self.right[node]), node)
+
+    def predict_margin(self, X):
+        """Raw log-odds, like Booster.predict(output_margin=True)"""
+        return self.base_margin + self.value[self.leaves(X)].sum(axis=1)
+
+    def predict_proba(self, X):
+        """Probability of the positive class (Attack) for each row"""
+        return 1.0 / (1.0 + np.exp(-self.predict_margin(X)))
+
+    # ============================================
+    # Exact TreeSHAP (Lundberg et al., path-dependent), vectorized over rows and leaves
+    # ============================================
+
+    # Rows explained per pass; the per-pass arrays are rows x leaves x path features
+    SHAP_CHUNK_ROWS = 64
+
+    def _leaf_paths(self):
+        """
+        Per-leaf path tables for contributions(), built once per ensemble.
+        For leaf l the distinct features on its root path are slots j = 0..k-1:
+          path_feature[l, j]   feature of slot j
+          path_zero[l, j]      product of cover ratios along the splits on that feature
+                               (share of the data that follows the path when the feature is unknown)
+          path_weight[l, m]    Shapley weight m! (k-1-m)! / k! of a coalition of m other slots
+        and split s of the path is split_node[l, s], taken to the left when
+        split_left[l, s], belonging to slot split_slot[l, s].
+        Unused slots have zero 1 and no feature mask, unused splits always agree.
+        """
+        if self._paths is not None:
+            return self._paths
+        leaves = []  # (leaf, [(node, went_left, feature, cover ratio), ...])
+        for root in self.roots.tolist():
+            stack = [(root, [])]
+            while stack:
+                node, path = stack.pop()
+                left, right = int(self.left[node]), int(self.right[node])
+                if left == -1:
+                    leaves.append((node, path))
+                    continue
+                feature, cover = int(self.feature[node]), self.cover[node]
+                stack.append((right, path + [(node, False, feature, self.cover[right] / cover)]))
+                stack.append((left, path + [(node, True, feature, self.cover[left] / cover)]))
+
+        n_leaves = len(leaves)
+        n_slots = max(len({step[2] for step in path}) for _, path in leaves)
+        n_splits = max(len(path) for _, path in leaves)
+        paths = {
+            'value': self.value[[leaf for leaf, _ in leaves]],
+            'path_feature': np.zeros((n_leaves, n_slots), dtype=np.int32),
+            'path_zero': np.ones((n_leaves, n_slots)),
+            'path_used': np.zeros((n_leaves, n_slots), dtype=bool),
+            'path_weight': np.zeros((n_leaves, n_slots)),
+            'split_node': np.zeros((n_leaves, n_splits), dtype=np.int32),
+            'split_left': np.zeros((n_leaves, n_splits), dtype=bool),
+            'split_slot': np.zeros((n_leaves, n_splits, n_slots)),  # One-hot slot of each split
+        }
+        for row, (_, path) in enumerate(leaves):
+            slots = {}
+            for position, (node, went_left, feature, ratio) in enumerate(path):
+                slot = slots.setdefault(feature, len(slots))
+                paths['path_feature'][row, slot] = feature
+                paths['path_zero'][row, slot] *= ratio
+                paths['split_node'][row, position] = node
+                paths['split_left'][row, position] = went_left
+                paths['split_slot'][row, position, slot] = 1.0
+            k = len(slots)
+            paths['path_used'][row, :k] = True
+            for m in range(k):
+                paths['path_weight'][row, m] = math.factorial(m) * math.factorial(k - 1 - m) / math.factorial(k)
+        # Sums the (leaf, slot) contributions into features
+        scatter = np.zeros((n_leaves * n_slots, self.n_features))
+        scatter[np.flatnonzero(paths['path_used']), paths['path_feature'][paths['path_used']]] = 1.0
+        paths['scatter'] = scatter
+        self._paths = paths
+        return paths
+
+    def contributions(self, X):
+        """
+        Per-feature SHAP contributions in margin (log-odds) space, shape (n, n_features).
+        Matches shap.TreeExplainer / xgboost pred_contribs for the same model.
+        """
+        X = np.asarray(X, dtype=np.float32)
+        phi = np.zeros((X.shape[0], self.n_features))
+        for start in range(0, X.shape[0], self.SHAP_CHUNK_ROWS):
+            stop = start + self.SHAP_CHUNK_ROWS
+            phi[start:stop] = self._tree_shap(X[start:stop])
+        return phi
+
+    def _tree_shap(self, X):
+        """
+        For a leaf with value v and path slots j (zero fraction z_j, one fraction
+        o_j = 1 when the row takes every split on feature j, else 0), slot j gets
+            v * (o_j - z_j) * sum_m w_m * e_m(j)
+        where e_m(j) is the t^m coefficient of prod over i != j of (z_i + o_i t).
+        All leaves of all trees are evaluated at once.
+        """
+        paths = self._leaf_paths()
+        n = X.shape[0]
+        zero = paths['path_zero']
+        n_slots = zero.shape[1]
+        if not n_slots:
+            return np.zeros((n, self.n_features))
+
+        # Direction of every row at every split node, then whether each slot's splits all agree
+        values = X[:, self.feature]
+        goes_left = np.where(np.isnan(values), self.default_left, values < self.threshold)
+        disagree = goes_left[:, paths['split_node']] != paths['split_left']
+        misses = np.einsum('nls,lsj->nlj', disagree, paths['split_slot'])
+        one = ((misses == 0) & paths['path_used']).astype(np.float64)
+
+        # prod over all slots of (z_j + o_j t); unused slots are (1 + 0 t)
+        poly = np.zeros((n, zero.shape[0], n_slots + 1))
+        poly[..., 0] = 1.0
+        for j in range(n_slots):
+            shifted = np.zeros_like(poly)
+            shifted[..., 1:] = poly[..., :-1]
+            poly = zero[:, j, None] * poly + one[..., j, None] * shifted
+
+        contrib = np.empty_like(one)
+        weight = paths['path_weight']
+        for j in range(n_slots):
+            z = zero[:, j]
+            # Divide slot j back out: by (z + t) top-down when o_j = 1, by z when o_j = 0
+            total_one = np.zeros(one.shape[:2])
+            quotient = poly[..., n_slots]
+            for m in range(n_slots - 1, -1, -1):
+                total_one += weight[:, m] * quotient
+                quotient = poly[..., m] - z * quotient
+            total_zero = (poly[..., :n_slots] * weight).sum(axis=2) / np.where(z > 0, z, 1.0)
+            total = np.where(one[..., j] > 0, total_one, np.where(z > 0, total_zero, 0.0))
+            contrib[..., j] = (one[..., j] - z) * total
+        contrib *= paths['value'][:, None]
+        return contrib.reshape(n, -1) @ paths['scatter']